@@ -1,13 +1,18 @@
 from qiskit_aer import AerSimulator
-from qiskit_ibm_runtime import fake_provider as q_fp
 
 import matplotlib
 from matplotlib import pyplot as plt
 
+import numpy as np
+
 import quantum_hardware
+import results_store
 import simulation
+import simulators
+import tester
 from quantum_hardware import ExperimentResult
 from image import Image
+from packed_bits import to_array
 
 matplotlib.use("TkAgg")  # or 'Agg', 'Qt5Agg', etc.
 
@@ -76,10 +81,9 @@ def measure_fidelity_hardware():
 
     print("Transmitting message of length ", len(message))
 
-    for q in qubit_counts:
+    def save_result(q: int, exp_result: ExperimentResult):
         # color print the qubit count
         print(f"[\033[1;32;40m{q} qubits\033[0m]")
-        exp_result: ExperimentResult = quantum_hardware.run(message, q)
 
         message_result: str = exp_result.bitstring
         image_result: Image = Image.from_bitstr(
@@ -88,17 +92,22 @@ def measure_fidelity_hardware():
 
         print(f"Finished transmitting image with a fidelity of {exp_result.fidelity}!")
 
-        # write to a file for later analysis with qubit count and fidelity
-        with open("fidelity_results.txt", "a") as f:
-            f.write(f"{q} qubits | {exp_result.fidelity}\n")
+        # store the qubit count, fidelity and received message for later analysis
+        results_store.append(
+            "image_fidelity",
+            {"backend": "ibm_sherbrooke", "package_length": q, "fidelity": exp_result.fidelity},
+            to_array(message_result)[np.newaxis, :],
+        )
 
         # save the image in images/hardware/sherbrooke with the qubit count as title
         image_result.buffer.save(f"images/hardware/sherbrooke/{q}_qubits.png")
 
+    # submit every qubit count up front and handle each one as soon as its job finishes
+    quantum_hardware.run_many(message, qubit_counts, callback=save_result)
+
 
 def transmit_img_decoherence():
-    device_backend = q_fp.FakeAlgiers()
-    simulator = AerSimulator.from_backend(device_backend)
+    simulator = simulators.simulator("FakeAlgiers")
 
     image = Image("./images/mario.png")
     message = image.to_bitstr(compress_flag=False)
@@ -119,23 +128,13 @@ def graph_decoherence():
     message = "111111111111"
 
     delays = [0, 100, 200, 300, 400]
-    fidelity = []
-
-    for delay in delays:
-        device_backend = q_fp.FakeAlgiers()
-        simulator = AerSimulator.from_backend(device_backend)
-
-        circuits = simulation.build_circuits_transpiled(message, 2, simulator, delay)
-        message_results = simulation.simulate(simulator, circuits, 1000)
-        total_matches = 0
-
-        for res in message_results:
-            total_matches += sum([c1 == c2 for c1, c2 in zip(message, res)])
 
-        avg_matches = total_matches / len(message_results)
-        acc = 100 * avg_matches / len(message)
-        fidelity.append(acc)
+    # transpile once for all delays and simulate every delay in one run
+    simulator = simulators.simulator("FakeAlgiers")
+    accuracies = tester.decoherence_sweep(simulator, message, 2, delays, 1000, [tester.mean_similarity])
+    fidelity = list(100 * accuracies[:, 0])
 
+    for acc in fidelity:
         print(f"{acc}%")
 
     # Create the plot
@@ -0,0 +1,116 @@
+import sys
+from timeit import timeit
+
+sys.path.append("..")
+sys.path.append(".")
+
+import numpy as np
+from bitstring import Bits
+from PIL import Image as PILImage
+
+import image
+
+
+def reference_convert_bitstr_to_bytes(bitstr: str, precision: int = 8) -> bytes:
+    # Original per-byte implementation, kept to check the vectorized one against
+    bit_chunks = [bitstr[i : i + precision] for i in range(0, len(bitstr), precision)]
+    bytes_list = [Bits(bin=chunk, length=precision).tobytes() for chunk in bit_chunks]
+
+    return b"".join(bytes_list)
+
+
+def reference_convert_bytes_to_bitstr(data: bytes, precision: int = 8) -> str:
+    # Original per-byte implementation, kept to check the vectorized one against
+    bit_chunks = [Bits(uint=byte, length=precision).bin for byte in data]
+
+    return "".join(bit_chunks)
+
+
+def random_frame(width: int = 1000, height: int = 1000) -> PILImage.Image:
+    # 1-megapixel RGB frame with random content
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+    return PILImage.fromarray(pixels, "RGB")
+
+
+def bench(name: str, reference, vectorized, repeat: int = 1) -> None:
+    reference_time = timeit(reference, number=repeat) / repeat
+    vectorized_time = timeit(vectorized, number=repeat) / repeat
+    print(
+        f"{name:<24} reference {reference_time * 1000:10.1f} ms | "
+        f"vectorized {vectorized_time * 1000:8.1f} ms | speedup {reference_time / vectorized_time:7.1f}x"
+    )
+
+
+def codec_benchmark(repeat: int = 20):
+    # Transmitted qubits per pixel (superdense coding sends one bit per qubit) and encode/decode time of every codec,
+    # for the mario sprite in color, in black and white and as palette indices, and for a 1-megapixel frame of 4x4 pixel
+    # blocks
+    images = [
+        ("mario RGB", image.Image("images/mario.png"), "RGB"),
+        ("mario 1", image.Image("images/mario.png"), "1"),
+        ("mario palette", image.Image("images/mario.png"), image.PALETTE),
+    ]
+    frame = image.Image.__new__(image.Image)
+    frame.buffer = random_frame(250, 250).resize((1000, 1000), PILImage.NEAREST)
+    frame.width, frame.height = frame.buffer.size
+    images.append(("1-megapixel blocky RGB", frame, "RGB"))
+
+    for name, img, mode in images:
+        pixels = img.width * img.height
+        print(f"{name}: {pixels} pixels")
+        uncompressed = image.Image.from_bitstr(
+            img.to_bitstr(mode, compress_flag=False), img.width, img.height, mode, compress_flag=False
+        )
+        for codec in image.codecs:
+            if codec == "lz4_ascii" and pixels > 100000:
+                # compressing the 8x expanded text takes minutes at this size
+                print(f"  {codec:<10} skipped")
+                continue
+            bitstr = img.to_bitstr(mode, packed=True, codec=codec)
+            decoded = image.Image.from_bitstr(bitstr, img.width, img.height, mode, codec=codec)
+            assert decoded.buffer.tobytes() == uncompressed.buffer.tobytes()
+
+            number = 1 if pixels > 100000 else repeat
+            encode_time = timeit(lambda: img.to_bitstr(mode, packed=True, codec=codec), number=number) / number
+            decode_time = timeit(
+                lambda: image.Image.from_bitstr(bitstr, img.width, img.height, mode, codec=codec), number=number
+            ) / number
+            print(
+                f"  {codec:<10} {len(bitstr) / pixels:8.3f} qubits/pixel | {len(bitstr) // 8:8d} circuits of 8 qubits | "
+                f"encode {encode_time * 1000:8.2f} ms | decode {decode_time * 1000:8.2f} ms"
+            )
+
+
+def conversion_benchmark():
+    data = random_frame().tobytes()
+    bitstr = image.convert_bytes_to_bitstr(data)
+
+    # Both implementations must be bit-exact before their speed is compared
+    assert image.convert_bytes_to_bitstr(data) == reference_convert_bytes_to_bitstr(data)
+    assert image.convert_bitstr_to_bytes(bitstr) == reference_convert_bitstr_to_bytes(bitstr)
+    for precision in [3, 12, 16]:
+        sample = bytes(byte % (1 << precision) for byte in data[:4096])
+        sample_bitstr = image.convert_bytes_to_bitstr(sample, precision)
+        assert sample_bitstr == reference_convert_bytes_to_bitstr(sample, precision)
+        assert image.convert_bitstr_to_bytes(sample_bitstr, precision) == reference_convert_bitstr_to_bytes(
+            sample_bitstr, precision
+        )
+
+    print(f"1-megapixel RGB frame: {len(data)} bytes, {len(bitstr)} bits")
+    bench(
+        "bytes -> bitstr",
+        lambda: reference_convert_bytes_to_bitstr(data),
+        lambda: image.convert_bytes_to_bitstr(data),
+    )
+    bench(
+        "bitstr -> bytes",
+        lambda: reference_convert_bitstr_to_bytes(bitstr),
+        lambda: image.convert_bitstr_to_bytes(bitstr),
+    )
+
+
+if __name__ == "__main__":
+    conversion_benchmark()
+    codec_benchmark()
@@ -1,5 +1,7 @@
 from qiskit import QuantumCircuit
 
+from packed_bits import PackedBits, as_bitstr
+
 
 def assert_bitstring(bitstring: str) -> None:
     if len(bitstring) % 2 == 1:
@@ -36,9 +38,9 @@ def encode_bit_pair(circuit: QuantumCircuit, bit_pair: str, index: int) -> None:
         circuit.x(index)
 
 
-def build_circuit(bits: str, delay_us: float = 0.0) -> QuantumCircuit:
+def build_circuit(bits: str | PackedBits, delay_us: float = 0.0) -> QuantumCircuit:
     # Reverse bitstring and check validity
-    bits = bits[::-1]
+    bits = as_bitstr(bits)[::-1]
     assert_bitstring(bits)
 
     # Initialize quantum circuit
@@ -69,12 +71,15 @@ def build_circuit(bits: str, delay_us: float = 0.0) -> QuantumCircuit:
     return circuit
 
 
-def build_circuits(bits: str, package_length: int, delay_us: float = 0.0) -> list:
+def build_circuits(bits: str | PackedBits, package_length: int, delay_us: float = 0.0) -> list:
     # Check validity of package length
     assert_package_length(package_length)
 
     # Divide bits into equally sized packages (with the last bits as the remainder package)
-    packages = list(bits[i:i+package_length] for i in range(0, len(bits), package_length))
+    if isinstance(bits, PackedBits):
+        packages = bits.packets(package_length)
+    else:
+        packages = list(bits[i:i+package_length] for i in range(0, len(bits), package_length))
 
     # Build the circuits
     return list(build_circuit(package, delay_us=delay_us) for package in packages)
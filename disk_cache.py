@@ -0,0 +1,39 @@
+import os
+from pathlib import Path
+
+# Single-file entries shared by the disk caches (transpile_cache, simulators). An entry is built on a miss and written
+# to a temporary file first, so parallel worker processes never read a partially written entry.
+
+
+def store(path: Path, value, write) -> None:
+    # Writes the value with write(value, file) and moves the complete file into place at once
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(temporary, "wb") as file:
+        write(value, file)
+    os.replace(temporary, path)
+
+
+def cached(path: Path, build, read, write):
+    """Returns the entry stored in a file, building and storing it first if there is none
+
+    Args:
+        path (Path): File of the entry
+        build: Function returning the value, called on a miss
+        read: Function reading the value from the open file
+        write: Function writing the value to an open file, called as write(value, file)
+
+    Returns:
+        Returns the stored or newly built value
+    """
+    if path.exists():
+        try:
+            with open(path, "rb") as file:
+                return read(file)
+        except Exception:
+            # A corrupt or unreadable entry is built again and overwritten
+            path.unlink(missing_ok=True)
+
+    value = build()
+    store(path, value, write)
+    return value
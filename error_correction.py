@@ -1,3 +1,7 @@
+import numpy as np
+
+from packed_bits import PackedBits, to_array
+
 pre_coding_threshold = 0.5
 pre_coding_no = "0"
 pre_coding_yes = "1"
@@ -15,39 +19,101 @@ def pre_coding_optimize_assert_n(n: int) -> None:
         raise ValueError("Invalid bit length: n should be an even number")
 
 
-def repetition_encode(bitstring: str, n: int=3) -> str:
+def repetition_encode(bitstring: str | PackedBits, n: int=3) -> str | PackedBits:
     # Repeats each bit in the string n times
     repetition_assert_n(n)
+    if isinstance(bitstring, PackedBits):
+        return PackedBits.from_array(repetition_encode_batch(to_array(bitstring)[np.newaxis], n)[0])
     return "".join(bit * n for bit in bitstring)
 
 
-def repetition_decode(bitstring: str, n: int=3) -> str:
+def repetition_decode(bitstring: str | PackedBits, n: int=3) -> str | PackedBits:
     # Retrieves each bit from multiple sent bits using majority voting
     repetition_assert_n(n)
     threshold = int((n - 1) / 2)
 
+    if isinstance(bitstring, PackedBits):
+        return PackedBits.from_array(repetition_decode_batch(to_array(bitstring)[np.newaxis], n)[0])
+
     results = list(bitstring[i:i + n] for i in range(0, len(bitstring), n))
     return "".join(list("1" if bit.count("1") > threshold else "0" for bit in results))
 
 
-def bitstring_invert(bitstring: str) -> str:
+def bitstring_invert(bitstring: str | PackedBits) -> str | PackedBits:
     # Flips every '0' to '1' and '1' to '0'
+    if isinstance(bitstring, PackedBits):
+        return bitstring.invert()
     return "".join("1" if bit == "0" else "0" for bit in bitstring)
 
 
-def pre_coding_optimize_encode(bitstring: str, n: int=2) -> str:
+def pre_coding_optimize_encode(bitstring: str | PackedBits, n: int=2) -> str | PackedBits:
     # Determines if bitstring should be inverted to achieve least '1' count and adds bits signaling if the bitstring
     # has been inverted or not.
     pre_coding_optimize_assert_n(n)
     count_1 = bitstring.count("1") / len(bitstring)
+    if isinstance(bitstring, PackedBits):
+        return PackedBits.from_array(pre_coding_optimize_encode_batch(to_array(bitstring)[np.newaxis], n)[0])
     if count_1 > pre_coding_threshold:
         return n * pre_coding_yes + bitstring_invert(bitstring)
     return n * pre_coding_no + bitstring
 
 
-def pre_coding_optimize_decode(bitstring: str, n: int=2) -> str:
+def pre_coding_optimize_decode(bitstring: str | PackedBits, n: int=2) -> str | PackedBits:
     # Reads the first few bits to determine if the bitstring has been inverted or not and returns the original bitstring
     pre_coding_optimize_assert_n(n)
     if bitstring[0:n] == n * pre_coding_no:
         return bitstring[n:]
     return  bitstring_invert(bitstring[n:])
+
+
+# Batched forms: each takes a (shots x bits) uint8 matrix holding one 0/1 value per element and decodes every row at
+# once. They give the same result per row as the single bitstring functions above.
+
+def repetition_encode_batch(bits: np.ndarray, n: int=3) -> np.ndarray:
+    # Repeats each bit in every row n times
+    repetition_assert_n(n)
+    return np.repeat(bits, n, axis=1)
+
+
+def repetition_decode_batch(bits: np.ndarray, n: int=3) -> np.ndarray:
+    # Majority voting as a sum over each group of n bits (the last group may be shorter, as in repetition_decode)
+    repetition_assert_n(n)
+    threshold = int((n - 1) / 2)
+
+    if bits.shape[1] == 0:
+        return bits
+    votes = np.add.reduceat(bits, np.arange(0, bits.shape[1], n), axis=1, dtype=np.uint32)
+    return (votes > threshold).astype(np.uint8)
+
+
+def bitstring_invert_batch(bits: np.ndarray) -> np.ndarray:
+    # Flips every bit in every row
+    return bits ^ 1
+
+
+def pre_coding_optimize_encode_batch(bits: np.ndarray, n: int=2) -> np.ndarray:
+    # Inverts the rows with a majority of '1' bits and prepends n flag bits to every row
+    pre_coding_optimize_assert_n(n)
+    inverted = (bits.sum(axis=1) / bits.shape[1] > pre_coding_threshold).astype(np.uint8)[:, np.newaxis]
+    return np.hstack((np.repeat(inverted, n, axis=1), bits ^ inverted))
+
+
+def pre_coding_optimize_decode_batch(bits: np.ndarray, n: int=2) -> np.ndarray:
+    # A row counts as not inverted only if all of its n flag bits are '0', as in pre_coding_optimize_decode
+    pre_coding_optimize_assert_n(n)
+    inverted = bits[:, :n].any(axis=1).astype(np.uint8)[:, np.newaxis]
+    return bits[:, n:] ^ inverted
+
+
+batched_methods = {
+    repetition_encode: repetition_encode_batch,
+    repetition_decode: repetition_decode_batch,
+    bitstring_invert: bitstring_invert_batch,
+    pre_coding_optimize_encode: pre_coding_optimize_encode_batch,
+    pre_coding_optimize_decode: pre_coding_optimize_decode_batch,
+}
+
+
+def get_batched(method):
+    # Returns the batched form of an encode or decode method, or None if it has none
+    return batched_methods.get(method)
@@ -1,50 +1,184 @@
+import lzma
+import zlib
 from typing import Final, Self
 import matplotlib.pyplot as plt
 import numpy as np
 from pathlib import Path
 from PIL import Image as PILImage
-from bitstring import Bits
 
+import lz4.block
 import lz4.frame
 
+from packed_bits import PackedBits
+
 PRECISION: Final[int] = 8
 
+# encoding that sends the palette of the image once, followed by the palette index of every pixel
+PALETTE: Final[str] = "palette"
+MAX_PALETTE_COLORS: Final[int] = 256
+
+
+# legacy compression of a bitstring: lz4 over its '0'/'1' text. Images are compressed with the codecs below instead.
+def decompress(bitstr: str | PackedBits) -> str | PackedBits:
+    if isinstance(bitstr, PackedBits):
+        # read the decompressed '0'/'1' characters as bits directly, without building a string
+        decompressed = lz4.frame.decompress(bitstr.to_bytes())
+        return PackedBits.from_array(np.frombuffer(decompressed, dtype=np.uint8) - ord("0"))
 
-def decompress(bitstr: str) -> str:
-    raw_bitstr = Bits(bin=bitstr).tobytes()
+    raw_bitstr = PackedBits.from_str(bitstr).to_bytes()
     bitstr = lz4.frame.decompress(raw_bitstr).decode()
 
     return bitstr
 
 
-def compress(bitstr: str) -> str:
-    compressed_bits = lz4.frame.compress(
-        bitstr.encode(), compression_level=lz4.frame.COMPRESSIONLEVEL_MAX
-    )
-    bitstr = Bits(bytes=compressed_bits).bin
+def compress(bitstr: str | PackedBits) -> str | PackedBits:
+    # the '0'/'1' characters of packed bits are written as bytes directly, without building a string
+    text = (bitstr.to_array() + ord("0")).tobytes() if isinstance(bitstr, PackedBits) else bitstr.encode()
+    compressed_bits = lz4.frame.compress(text, compression_level=lz4.frame.COMPRESSIONLEVEL_MAX)
+    if isinstance(bitstr, PackedBits):
+        return PackedBits.from_bytes(compressed_bits)
+
+    bitstr = convert_bytes_to_bitstr(compressed_bits)
 
     return bitstr
 
 
-def convert_bitstr_to_bytes(bitstr: str, precision: int = 8) -> bytes:
-    # split up the bitstring into precision bit-chunks
-    bit_chunks = [bitstr[i : i + precision] for i in range(0, len(bitstr), precision)]
+def rle_encode(data: bytes) -> bytes:
+    # run-length codes the data in units of 1 to 4 bytes (e.g. one pixel), as (run length - 1, unit) pairs with runs of
+    # at most 256 units. The unit size giving the shortest code is stored in the first byte.
+    best = None
+    for unit in range(1, 5):
+        if len(data) % unit != 0:
+            continue
+        units = np.frombuffer(data, dtype=np.uint8).reshape(-1, unit)
+
+        # split the data into runs of equal units, and the runs into pieces of at most 256 units
+        starts = np.flatnonzero(np.r_[True, np.any(units[1:] != units[:-1], axis=1)])
+        lengths = np.diff(np.r_[starts, len(units)])
+        pieces = (lengths + 255) // 256
+        piece_starts = np.repeat(starts, pieces) + 256 * (
+            np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        )
+        piece_lengths = np.minimum(np.diff(np.r_[piece_starts, len(units)]), 256)
+
+        code = np.hstack(((piece_lengths - 1).astype(np.uint8)[:, np.newaxis], units[piece_starts]))
+        encoded = bytes([unit]) + code.tobytes()
+        if best is None or len(encoded) < len(best):
+            best = encoded
+
+    return best
+
+
+def rle_decode(data: bytes) -> bytes:
+    unit = data[0]
+    code = np.frombuffer(data, dtype=np.uint8, offset=1).reshape(-1, unit + 1)
+    return np.repeat(code[:, 1:], code[:, 0].astype(np.int64) + 1, axis=0).tobytes()
+
+
+def lz4_ascii_encode(data: bytes) -> bytes:
+    # legacy compression: lz4 over the '0'/'1' text of the bits, as compress does
+    text = (np.unpackbits(np.frombuffer(data, dtype=np.uint8)) + ord("0")).tobytes()
+    return lz4.frame.compress(text, compression_level=lz4.frame.COMPRESSIONLEVEL_MAX)
+
+
+def lz4_ascii_decode(data: bytes) -> bytes:
+    return np.packbits(np.frombuffer(lz4.frame.decompress(data), dtype=np.uint8) - ord("0")).tobytes()
+
+
+# raw LZMA2 stream without the .xz container, as every byte sent costs 8 qubits
+_lzma_filters: Final[list] = [{"id": lzma.FILTER_LZMA2, "preset": 9 | lzma.PRESET_EXTREME}]
+
+# codecs for the raw pixel bytes of an image by name, as (compress, decompress) pairs on bytes. Headers and checksums
+# are left out wherever the format allows it.
+codecs: Final[dict] = {
+    "none": (lambda data: data, lambda data: data),
+    "lz4": (
+        lambda data: lz4.block.compress(data, mode="high_compression", compression=12),
+        lz4.block.decompress,
+    ),
+    "zlib": (
+        lambda data: zlib.compress(data, 9, wbits=-15),
+        lambda data: zlib.decompress(data, wbits=-15),
+    ),
+    "lzma": (
+        lambda data: lzma.compress(data, format=lzma.FORMAT_RAW, filters=_lzma_filters),
+        lambda data: lzma.decompress(data, format=lzma.FORMAT_RAW, filters=_lzma_filters),
+    ),
+    "rle": (rle_encode, rle_decode),
+    "lz4_ascii": (lz4_ascii_encode, lz4_ascii_decode),
+}
+
+
+def get_codec(codec: str) -> tuple:
+    if codec not in codecs:
+        raise ValueError(f"Invalid codec: {codec}")
+    return codecs[codec]
+
 
-    # convert each bit-chunk to a byte using the Bits class
-    bytes_list = [Bits(bin=chunk, length=precision).tobytes() for chunk in bit_chunks]
+def palette_encode(image: PILImage.Image) -> bytes:
+    # header of the color count - 1 and the RGB value of every color, followed by the palette index of every pixel in
+    # ceil(log2(colors)) bits, packed and zero padded to whole bytes. Images with more than MAX_PALETTE_COLORS colors
+    # are quantized to that many colors first, otherwise the palette is exact and the encoding lossless.
+    image = image.convert("RGB")
+    if image.getcolors(MAX_PALETTE_COLORS) is None:
+        image = image.quantize(MAX_PALETTE_COLORS).convert("RGB")
 
-    # concatenate the bytes together
-    byt = b"".join(bytes_list)
+    pixels = np.asarray(image).reshape(-1, 3)
+    colors, indices = np.unique(pixels, axis=0, return_inverse=True)
+    index_bits = max(int(np.ceil(np.log2(len(colors)))), 1)
 
-    return byt
+    # the bits of every index, most significant first
+    shifts = np.arange(index_bits - 1, -1, -1)
+    bits = ((indices.reshape(-1, 1) >> shifts) & 1).astype(np.uint8)
+
+    header = bytes([len(colors) - 1]) + colors.astype(np.uint8).tobytes()
+    return header + np.packbits(bits.reshape(-1)).tobytes()
+
+
+def palette_decode(data: bytes, size: tuple[int, int]) -> PILImage.Image:
+    values = np.frombuffer(data, dtype=np.uint8)
+    color_count = int(values[0]) + 1
+    colors = values[1:1 + 3 * color_count].reshape(-1, 3)
+    index_bits = max(int(np.ceil(np.log2(color_count))), 1)
+
+    pixel_count = size[0] * size[1]
+    bits = np.unpackbits(values[1 + 3 * color_count:], count=pixel_count * index_bits).reshape(-1, index_bits)
+    indices = bits.astype(np.int64) @ (1 << np.arange(index_bits - 1, -1, -1))
+    if np.any(indices >= color_count):
+        raise ValueError("Invalid content: pixel refers to a color outside of the palette")
+
+    return PILImage.fromarray(colors[indices].reshape(size[1], size[0], 3), "RGB")
+
+
+def convert_bitstr_to_bytes(bitstr: str, precision: int = 8) -> bytes:
+    # view the bitstring as an array of 0/1 values without copying it
+    bits = np.frombuffer(bitstr.encode("ascii"), dtype=np.uint8) - ord("0")
+    if np.any(bits > 1):
+        raise ValueError("Invalid content: bitstring can only contain 0 and 1 values")
+    if len(bits) % precision != 0:
+        raise ValueError("Invalid length: bitstring should be a multiple of precision bits long")
+
+    # split up the bitstring into precision bit-chunks and pack each chunk into (zero padded) bytes
+    bit_chunks = bits.reshape(-1, precision)
+
+    return np.packbits(bit_chunks, axis=1).tobytes()
 
 
 def convert_bytes_to_bitstr(data: bytes, precision: int = 8) -> str:
-    # for each byte in the data, convert it to a bitstring using the Bits class
+    # unpack every byte in the data to its 8 bits in a single pass
+    values = np.frombuffer(data, dtype=np.uint8)
+    if precision < 8 and np.any(values >> precision):
+        raise ValueError(f"Invalid content: bytes do not fit in {precision} bits")
+
+    bits = np.unpackbits(values[:, np.newaxis], axis=1)
 
-    bit_chunks = [Bits(uint=byte, length=precision).bin for byte in data]
+    # widen or narrow each byte to precision bits
+    if precision > 8:
+        bits = np.pad(bits, ((0, 0), (precision - 8, 0)))
+    else:
+        bits = bits[:, 8 - precision:]
 
-    return "".join(bit_chunks)
+    return (bits + ord("0")).tobytes().decode("ascii")
 
 
 class Image:
@@ -54,6 +188,7 @@ class Image:
     buffer: PILImage.Image
 
     encoding: str = "RGB"
+    codec: str = "zlib"
 
     def __init__(self, path: str):
         self.path = Path(path)
@@ -67,53 +202,75 @@ class Image:
         self.height = self.buffer.height
 
     @staticmethod
-    def _decode(bitstr: str, mode: str, size: tuple[int, int]) -> PILImage.Image:
+    def _decode(bitstr: str | PackedBits, mode: str, size: tuple[int, int], codec: str = "none") -> PILImage.Image:
         """Decodes a bitstring to a PIL Image
 
         Args:
-            bitstr (str): Bitstring to decode
-            mode (str): Image mode
+            bitstr (str | PackedBits): Bitstring to decode
+            mode (str): Image mode, or PALETTE
             size (tuple[int, int]): Image size
+            codec (str, optional): Codec the pixel bytes were compressed with. Defaults to "none".
 
         Returns:
             PILImage.Image: Returns a PIL Image
         """
 
-        data: bytes = convert_bitstr_to_bytes(bitstr, PRECISION)
+        if isinstance(bitstr, PackedBits):
+            data: bytes = bitstr.to_bytes()
+        else:
+            data: bytes = convert_bitstr_to_bytes(bitstr, PRECISION)
+        data = get_codec(codec)[1](data)
 
+        if mode == PALETTE:
+            return palette_decode(data, size)
         return PILImage.frombytes(mode, size, data)
 
     @staticmethod
-    def _encode(image: PILImage.Image, mode: str) -> str:
+    def _encode(image: PILImage.Image, mode: str, packed: bool = False, codec: str = "none") -> str | PackedBits:
         """Encodes a PIL Image to a bitstring
 
+        Args:
+            image (PILImage.Image): Image to encode
+            mode (str): Image mode, or PALETTE to send the palette and the palette index of every pixel
+            packed (bool, optional): Return packed bits instead of a string. Defaults to False.
+            codec (str, optional): Codec to compress the pixel bytes with, see codecs. Defaults to "none".
+
         Returns:
-            str: Returns a bitstring
+            str | PackedBits: Returns a bitstring
         """
 
-        if mode != "1":
-            image = image.convert(mode)
+        if mode == PALETTE:
+            data: bytes = palette_encode(image)
+        elif mode != "1":
+            data: bytes = image.convert(mode).tobytes()
         else:
-            image = image.split()[0].point(lambda p: p > 1 and 255).convert(mode)
-        data: bytes = image.tobytes()
+            data: bytes = image.split()[0].point(lambda p: p > 1 and 255).convert(mode).tobytes()
+        data = get_codec(codec)[0](data)
+
+        if packed:
+            return PackedBits.from_bytes(data)
 
         return convert_bytes_to_bitstr(data)
 
     @classmethod
     def from_bitstr(
         cls: Self,
-        bitstr: str,
+        bitstr: str | PackedBits,
         width: int = 16,
         height: int = 16,
         encoding: str = None,
         compress_flag: bool = True,
+        codec: str = None,
     ) -> Self:
         """Creates an instance of the Image class from a bitstring
 
         Args:
-            bitstr (str): Bitstring representation of the image
+            bitstr (str | PackedBits): Bitstring representation of the image
             width (int, optional): Image width. Defaults to 16.
             height (int, optional): Image height. Defaults to 8.
+            encoding (str, optional): Image mode, or PALETTE. Defaults to the class encoding.
+            compress_flag (bool, optional): Whether the bitstring is compressed. Defaults to True.
+            codec (str, optional): Codec the bitstring was compressed with. Defaults to the class codec.
 
         Returns:
             Image: Returns an instance of the Image class
@@ -124,29 +281,31 @@ class Image:
         new_instance.path = "bitstring"
 
         encoding = encoding or cls.encoding
+        codec = (codec or cls.codec) if compress_flag else "none"
 
-        if compress_flag:
-            bitstr = decompress(bitstr)
-
-        new_instance.buffer = cls._decode(bitstr, encoding, (width, height))
+        new_instance.buffer = cls._decode(bitstr, encoding, (width, height), codec)
 
         return new_instance
 
-    def to_bitstr(self, encoding: str = None, compress_flag: bool = True) -> str:
+    def to_bitstr(
+        self, encoding: str = None, compress_flag: bool = True, packed: bool = False, codec: str = None
+    ) -> str | PackedBits:
         """Converts the image to a bitstring
 
+        Args:
+            encoding (str, optional): Image mode, or PALETTE. Defaults to the class encoding.
+            compress_flag (bool, optional): Compress the bitstring. Defaults to True.
+            packed (bool, optional): Return packed bits instead of a string. Defaults to False.
+            codec (str, optional): Codec to compress the pixel bytes with, see codecs. Defaults to the class codec.
+
         Returns:
-            str: Returns the bitstring representation of the image
+            str | PackedBits: Returns the bitstring representation of the image
         """
 
         encoding = encoding or self.encoding
+        codec = (codec or self.codec) if compress_flag else "none"
 
-        bitstr = self._encode(self.buffer, encoding)
-
-        if compress_flag:
-            bitstr = compress(bitstr)
-
-        return bitstr
+        return self._encode(self.buffer, encoding, packed, codec)
 
     def display(self):
         """Displays the image using matplotlib"""
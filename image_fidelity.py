@@ -1,24 +1,14 @@
 import matplotlib.pyplot as plt
 
-# Data
-data = {
-    "126 qubits": 0.0009718172983479105,
-    "112 qubits": 0.0010044642857142856,
-    "100 qubits": 0.002626008064516129,
-    "96 qubits": 0.0017547607421875,
-    "80 qubits": 0.004134537337662338,
-    "64 qubits": 0.01025390625,
-    "32 qubits": 0.15796915690104166,
-    "16 qubits": 0.3507130940755208,
-    "8 qubits": 0.6817105611165365,
-    "4 qubits": 0.8736782073974609
-}
+import results_store
+
+# Data, measured with __main__.measure_fidelity_hardware
+package_lengths, fidelity = results_store.table("image_fidelity", "package_length", "fidelity",
+                                                backend="ibm_sherbrooke")
 
 # Extract keys and values
-qubits = list(data.keys())
-qubits.reverse()
-fidelity = [value * 100 for value in data.values()]  # Convert to percentages
-fidelity.reverse()
+qubits = [f"{package_length} qubits" for package_length in package_lengths]
+fidelity = fidelity * 100  # Convert to percentages
 
 # Create the plot
 plt.figure(figsize=(10, 6))
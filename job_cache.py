@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+from qiskit.primitives import BitArray, PrimitiveResult
+
+# Disk cache of the raw measurements of finished hardware jobs, keyed by job ID. Every job is a directory holding the
+# packed BitArray of each pub as an .npy file and an index.json with their number of bits, so a job can be parsed
+# again (with another decoder or package size) without contacting the service. Arrays are memory-mapped when loaded.
+# Set QGP_JOB_CACHE=0 to turn the cache off, or QGP_JOB_CACHE_DIR to move it.
+
+enabled: bool = os.environ.get("QGP_JOB_CACHE", "1") != "0"
+cache_dir: Path = Path(
+    os.environ.get("QGP_JOB_CACHE_DIR", Path.home() / ".cache" / "quantum_group_project" / "jobs")
+)
+
+
+def job_dir(job_id: str) -> Path:
+    return cache_dir / job_id
+
+
+def store(job_id: str, results: PrimitiveResult) -> None:
+    # Writes the measurements of every pub, then moves the complete directory into place at once
+    directory = job_dir(job_id)
+    temporary = directory.with_name(f"{job_id}.{os.getpid()}.tmp")
+    shutil.rmtree(temporary, ignore_errors=True)
+    temporary.mkdir(parents=True)
+
+    num_bits = []
+    for i, result in enumerate(results):
+        bit_array: BitArray = result.data.meas
+        np.save(temporary / f"pub_{i}.npy", bit_array.array)
+        num_bits.append(bit_array.num_bits)
+    with open(temporary / "index.json", "w") as file:
+        json.dump({"job_id": job_id, "num_bits": num_bits}, file)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(temporary, directory)
+
+
+def load(job_id: str) -> list[BitArray] | None:
+    # Returns the memory-mapped measurements of every pub of a cached job, or None if the job is not cached
+    directory = job_dir(job_id)
+    try:
+        with open(directory / "index.json") as file:
+            index = json.load(file)
+        return list(
+            BitArray(np.load(directory / f"pub_{i}.npy", mmap_mode="r"), num_bits)
+            for i, num_bits in enumerate(index["num_bits"])
+        )
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def cached_bit_arrays(job_id: str, fetch) -> list[BitArray]:
+    """Returns the measurements of every pub of a job, fetching the job only if it is not cached yet
+
+    Args:
+        job_id (str): ID of the job
+        fetch: Function returning the PrimitiveResult of the job, called on a cache miss
+
+    Returns:
+        list[BitArray]: Returns the measurements of every pub, in pub order
+    """
+    if enabled:
+        bit_arrays = load(job_id)
+        if bit_arrays is not None:
+            return bit_arrays
+
+    results: PrimitiveResult = fetch()
+    if not enabled:
+        return list(result.data.meas for result in results)
+
+    store(job_id, results)
+    return load(job_id)
+
+
+def clear() -> None:
+    shutil.rmtree(cache_dir, ignore_errors=True)
@@ -0,0 +1,247 @@
+from typing import Self
+
+import numpy as np
+
+
+class PackedBits:
+    """Compact bit container backed by a packed NumPy uint8 buffer
+
+    Bits are stored most significant bit first, the same order in which they appear in a '0'/'1' string, and the
+    unused bits of the last byte are always kept at zero.
+    """
+
+    data: np.ndarray
+    length: int
+
+    def __init__(self, data: np.ndarray | bytes = b"", length: int = None):
+        """Wraps an already packed buffer
+
+        Args:
+            data (np.ndarray | bytes): Packed bits, most significant bit first
+            length (int, optional): Number of valid bits. Defaults to all bits in the buffer.
+        """
+        data = np.frombuffer(data, dtype=np.uint8) if isinstance(data, (bytes, bytearray, memoryview)) else data
+        data = np.ascontiguousarray(data, dtype=np.uint8).reshape(-1)
+
+        if length is None:
+            length = 8 * data.size
+        if length < 0 or (length + 7) // 8 != data.size:
+            raise ValueError("Invalid length: length does not match the size of the packed buffer")
+
+        # Clear the padding bits so equal payloads always have equal buffers
+        padding = 8 * data.size - length
+        if padding and data[-1] & ((1 << padding) - 1):
+            data = data.copy()
+            data[-1] &= (0xFF << padding) & 0xFF
+
+        self.data = data
+        self.length = length
+
+    @classmethod
+    def from_str(cls, bitstr: str) -> Self:
+        """Creates packed bits from a '0'/'1' string
+
+        Args:
+            bitstr (str): Bitstring to pack
+
+        Returns:
+            PackedBits: Returns the packed bits
+        """
+        bits = np.frombuffer(bitstr.encode("ascii"), dtype=np.uint8) - ord("0")
+        if np.any(bits > 1):
+            raise ValueError("Invalid content: bitstring can only contain 0 and 1 values")
+
+        return cls(np.packbits(bits), len(bitstr))
+
+    @classmethod
+    def from_array(cls, bits: np.ndarray) -> Self:
+        """Creates packed bits from an array holding one 0/1 value per element
+
+        Args:
+            bits (np.ndarray): Unpacked bits
+
+        Returns:
+            PackedBits: Returns the packed bits
+        """
+        bits = np.asarray(bits, dtype=np.uint8).reshape(-1)
+
+        return cls(np.packbits(bits), bits.size)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, length: int = None) -> Self:
+        """Creates packed bits from a bytes buffer without copying it
+
+        Args:
+            data (bytes): Packed bits, most significant bit first
+            length (int, optional): Number of valid bits. Defaults to all bits in the buffer.
+
+        Returns:
+            PackedBits: Returns the packed bits
+        """
+        return cls(data, length)
+
+    def to_str(self) -> str:
+        """Converts the packed bits to a '0'/'1' string
+
+        Returns:
+            str: Returns the bitstring
+        """
+        return (self.to_array() + ord("0")).tobytes().decode("ascii")
+
+    def to_array(self) -> np.ndarray:
+        """Unpacks the bits to an array holding one 0/1 value per element
+
+        Returns:
+            np.ndarray: Returns the unpacked bits
+        """
+        return np.unpackbits(self.data, count=self.length)
+
+    def to_bytes(self) -> bytes:
+        """Returns the packed buffer, zero padded up to a whole byte
+
+        Returns:
+            bytes: Returns the packed bytes
+        """
+        return self.data.tobytes()
+
+    def count(self, bit: str | int = 1) -> int:
+        """Counts the amount of set (or cleared) bits
+
+        Args:
+            bit (str | int, optional): Bit value to count. Defaults to 1.
+
+        Returns:
+            int: Returns the amount of bits with the given value
+        """
+        ones = int(np.unpackbits(self.data).sum())
+
+        return ones if int(bit) == 1 else self.length - ones
+
+    def invert(self) -> Self:
+        """Flips every bit
+
+        Returns:
+            PackedBits: Returns the inverted bits
+        """
+        return PackedBits(np.invert(self.data), self.length)
+
+    def hamming_distance(self, other: "PackedBits | str") -> int:
+        """Counts the positions at which two equally long payloads differ
+
+        Args:
+            other (PackedBits | str): Payload to compare with
+
+        Returns:
+            int: Returns the Hamming distance
+        """
+        other = as_packed(other)
+        if self.length != other.length:
+            raise ValueError("Both payloads should be the same length")
+
+        return int(np.unpackbits(np.bitwise_xor(self.data, other.data)).sum())
+
+    def packets(self, package_length: int) -> list[Self]:
+        """Divides the bits into equally sized packets (with the last bits as the remainder packet)
+
+        Args:
+            package_length (int): Amount of bits per packet
+
+        Returns:
+            list[PackedBits]: Returns the packets in order
+        """
+        if package_length % 8 == 0:
+            # Byte aligned packets are views on the packed buffer
+            step = package_length // 8
+            return list(
+                PackedBits(self.data[i // 8:i // 8 + step], min(package_length, self.length - i))
+                for i in range(0, self.length, package_length)
+            )
+
+        bits = self.to_array()
+        return list(PackedBits.from_array(bits[i:i + package_length]) for i in range(0, self.length, package_length))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index: int | slice) -> "int | PackedBits":
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if step == 1 and start % 8 == 0:
+                length = max(stop - start, 0)
+                return PackedBits(self.data[start // 8:(start + length + 7) // 8], length)
+            return PackedBits.from_array(self.to_array()[index])
+
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("PackedBits index out of range")
+
+        return int(self.data[index // 8] >> (7 - index % 8)) & 1
+
+    def __add__(self, other: "PackedBits | str") -> Self:
+        other = as_packed(other)
+        if self.length % 8 == 0:
+            return PackedBits(np.concatenate((self.data, other.data)), self.length + other.length)
+
+        return PackedBits.from_array(np.concatenate((self.to_array(), other.to_array())))
+
+    def __invert__(self) -> Self:
+        return self.invert()
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, str):
+            other = PackedBits.from_str(other)
+        if not isinstance(other, PackedBits):
+            return NotImplemented
+
+        return self.length == other.length and np.array_equal(self.data, other.data)
+
+    def __hash__(self) -> int:
+        return hash((self.length, self.data.tobytes()))
+
+    def __str__(self) -> str:
+        return self.to_str()
+
+    def __repr__(self) -> str:
+        preview = self.to_str() if self.length <= 64 else self[:64].to_str() + "..."
+        return f"PackedBits('{preview}', length={self.length})"
+
+
+def as_packed(bits: PackedBits | str) -> PackedBits:
+    # Accepts both payload forms and returns packed bits
+    return bits if isinstance(bits, PackedBits) else PackedBits.from_str(bits)
+
+
+def as_bitstr(bits: PackedBits | str) -> str:
+    # Compatibility adapter: accepts both payload forms and returns a '0'/'1' string
+    return bits.to_str() if isinstance(bits, PackedBits) else bits
+
+
+def to_array(bits: PackedBits | str) -> np.ndarray:
+    # Unpacks either payload form to an array holding one 0/1 value per element
+    if isinstance(bits, PackedBits):
+        return bits.to_array()
+    return PackedBits.from_str(bits).to_array()
+
+
+def stack(payloads: list) -> np.ndarray:
+    # Stacks equally long payloads (either form) into a (payloads x bits) matrix holding one 0/1 value per element
+    if not payloads:
+        return np.zeros((0, 0), dtype=np.uint8)
+    if isinstance(payloads[0], PackedBits):
+        return np.vstack(list(payload.to_array() for payload in payloads))
+
+    joined = np.frombuffer("".join(payloads).encode("ascii"), dtype=np.uint8) - ord("0")
+    return joined.reshape(len(payloads), -1)
+
+
+def unstack(matrix: np.ndarray, packed: bool = False) -> list:
+    # Splits a (payloads x bits) matrix back into a list of payloads, as PackedBits or as '0'/'1' strings
+    matrix = np.asarray(matrix, dtype=np.uint8)
+    if packed:
+        rows = np.packbits(matrix, axis=1)
+        return list(PackedBits(row, matrix.shape[1]) for row in rows)
+
+    text = (matrix + ord("0")).tobytes().decode("ascii")
+    width = matrix.shape[1]
+    return list(text[i:i + width] for i in range(0, len(text), width)) if width else [""] * matrix.shape[0]
@@ -0,0 +1,125 @@
+import numpy as np
+import simulation
+import transpile_cache
+from packed_bits import PackedBits, to_array
+
+# Each circuit from build_circuit is a set of independent Bell pairs without any gates between the pairs, so a package
+# can be simulated pair by pair. The cost is then linear in the package length and the 28-qubit cap of a full
+# statevector simulation no longer applies.
+
+symbols = ["00", "01", "10", "11"]
+
+
+def pair_layout(simulator, package_length: int, delay_us: float = 0.0) -> list:
+    # Returns the physical qubit pair the transpiler assigns to each Bell pair of a package (in message order), or
+    # None for every pair if the simulator has no coupling constraints
+    pairs = package_length // 2
+    if simulator.target.build_coupling_map() is None:
+        return [None] * pairs
+
+    circuit = transpile_cache.cached_transpile(simulation.build_circuit("0" * package_length, delay_us), simulator)
+    layout = circuit.layout.initial_index_layout()
+
+    # build_circuit reverses the package, so message pair k sits on qubits (L - 2 - 2k, L - 1 - 2k)
+    return list(
+        (layout[package_length - 2 - 2 * k], layout[package_length - 1 - 2 * k])
+        for k in range(pairs)
+    )
+
+
+def _pair_circuit(simulator, symbol: str, qubits: tuple | None, delay_us: float, cache: dict):
+    # Transpiles the superdense coding circuit of a single Bell pair onto the given physical qubits. Aer only
+    # simulates the active qubits, so the backend's noise model is applied restricted to that pair.
+    key = (symbol, qubits)
+    if key not in cache:
+        circuit = simulation.build_circuit(symbol, delay_us)
+        cache[key] = transpile_cache.cached_transpile(
+            circuit, simulator, initial_layout=list(qubits) if qubits else None
+        )
+    return cache[key]
+
+
+def _pair_slots(length: int, package_length: int) -> tuple:
+    # Returns the length of the package each pair of the message belongs to and its position in that package
+    pair_index = np.arange(length // 2)
+    package_index = (2 * pair_index) // package_length
+    slots = pair_index - package_index * (package_length // 2)
+    lengths = np.minimum(package_length, length - package_index * package_length)
+    return lengths, slots
+
+
+def pair_distributions(simulator, package_length: int, delay_us: float = 0.0, shots: int = 10000,
+                       layout: list = None) -> np.ndarray:
+    # Estimates the outcome distribution of every Bell pair of a package for each of the four sent symbols. Returns a
+    # (pairs x 4 x 4) array with [k, sent, received] = P(received | sent) for pair k, symbols indexed as in `symbols`.
+    layout = pair_layout(simulator, package_length, delay_us) if layout is None else layout
+    cache = {}
+    circuits = list(
+        _pair_circuit(simulator, symbol, qubits, delay_us, cache) for qubits in layout for symbol in symbols
+    )
+
+    result = simulator.run(circuits, shots=shots, method="density_matrix").result()
+    distributions = np.zeros((len(layout), 4, 4))
+    for i in range(len(circuits)):
+        for outcome, count in result.get_counts(i).items():
+            distributions[i // 4, i % 4, int(outcome, 2)] = count / shots
+
+    return distributions
+
+
+def simulate_pairs(simulator, bitstring: str | PackedBits, package_length: int, shots: int, delay_us: float = 0.0,
+                   calibration_shots: int = None, seed: int = None) -> np.ndarray:
+    # Simulates the transmission of the bitstring pair by pair and returns a uint8 (shots x bits) matrix, in the same
+    # layout as simulation.simulate with as_array. Every distinct (package length, pair, symbol) is simulated once with
+    # enough shots for all of its copies, and the samples are scattered back to the copies. With calibration_shots,
+    # the per-pair outcome distributions are estimated first and all pairs are sampled from them at once instead.
+    simulation.assert_package_length(package_length, max_length=None)
+    bits = to_array(bitstring)
+    if len(bits) % 2 == 1:
+        raise ValueError("Invalid length: bitstring should be an even number of bits long")
+
+    rng = np.random.default_rng(seed)
+    sent = 2 * bits[0::2] + bits[1::2]
+    lengths, slots = _pair_slots(len(bits), package_length)
+    layouts = {length: pair_layout(simulator, length, delay_us) for length in np.unique(lengths)}
+
+    if calibration_shots is not None:
+        distributions = {
+            length: pair_distributions(simulator, length, delay_us, calibration_shots, layout)
+            for length, layout in layouts.items()
+        }
+        probabilities = np.array(list(
+            distributions[length][slot, symbol] for length, slot, symbol in zip(lengths, slots, sent)
+        )).reshape(-1, 4)
+
+        # Inverse transform sampling of every pair for every shot at once
+        cumulative = np.cumsum(probabilities, axis=1)
+        cumulative[:, -1] = 1.0
+        received = (rng.random((shots, len(sent), 1)) > cumulative[np.newaxis, :, :-1]).sum(axis=2)
+    else:
+        keys, inverse, multiplicity = np.unique(
+            np.column_stack((lengths, slots, sent)), axis=0, return_inverse=True, return_counts=True
+        )
+        inverse = inverse.reshape(-1)
+
+        # Circuits needing the same amount of shots are submitted together as one job
+        cache = {}
+        received = np.zeros((shots, len(sent)), dtype=np.uint8)
+        for copies in np.unique(multiplicity):
+            group = np.flatnonzero(multiplicity == copies)
+            circuits = list(
+                _pair_circuit(simulator, symbols[symbol], layouts[length][slot], delay_us, cache)
+                for length, slot, symbol in keys[group]
+            )
+            result = simulator.run(
+                circuits, shots=int(shots * copies), memory=False, method="density_matrix"
+            ).result()
+
+            for i, key_index in enumerate(group):
+                samples = simulation.counts_to_array(result.get_counts(i), 2, rng)
+                received[:, inverse == key_index] = (2 * samples[:, 0] + samples[:, 1]).reshape(copies, shots).T
+
+    matrix = np.zeros((shots, len(bits)), dtype=np.uint8)
+    matrix[:, 0::2] = received >> 1
+    matrix[:, 1::2] = received & 1
+    return matrix
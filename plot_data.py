@@ -1,14 +1,21 @@
 import numpy as np
 from matplotlib import pyplot as plt
 
+import results_store
+
 save_figs = False
+backend = "FakeCusco"
+
+
+def one_count(metadata: dict) -> int:
+    # Amount of '1'-bits in the transmitted bitstring of a run
+    return metadata["bitstring"].count("1")
 
 
-def plot_preset(results_path: str, filename: str, x_label: str, x_ticks: list=None):
+def plot_preset(experiment: str, variable_key: str, filename: str, x_label: str, x_ticks: list=None, **filters):
     # General method of plotting results
-    data = np.loadtxt(results_path)
-    variable = data[:,0]
-    results = 100 * data[:,1]
+    variable, results = results_store.table(experiment, variable_key, backend=backend, **filters)
+    results = 100 * results
 
     plt.figure()
     plt.tight_layout()
@@ -28,9 +35,8 @@ def plot_preset(results_path: str, filename: str, x_label: str, x_ticks: list=No
 
 def plot_backends():
     # Plot the data of the accuracy of each backend
-    data = np.loadtxt("results/backends.txt", dtype=str, delimiter=",")
-    backends = data[:,0]
-    results = 100 * np.array([float(result) for result in data[:,1]])
+    backends, results = results_store.table("backends", "backend")
+    results = 100 * results
 
     args = np.argsort(results)[::-1]
     backends = backends[args]
@@ -50,11 +56,11 @@ def plot_backends():
 
 def plot_pre_encode_optimize():
     # Plot the data of the accuracy of encoding off/on of 24-bit strings with increasing '1' count
-    data_off = np.loadtxt("results/FakeCusco/bit_flip_off.txt")
-    data_on = np.loadtxt("results/FakeCusco/bit_flip_on.txt")
-    bit_1_count = data_off[:,0]
-    results_off = 100 * data_off[:,1]
-    results_on = 100 * data_on[:,1]
+    bit_1_count, results_off = results_store.table("bit_flip", one_count, backend=backend, correction=None)
+    bit_1_count_on, results_on = results_store.table("bit_flip", one_count, backend=backend,
+                                                     correction=["pre_coding", 4])
+    results_off = 100 * results_off
+    results_on = 100 * results_on
 
     plt.figure()
     plt.tight_layout()
@@ -64,8 +70,8 @@ def plot_pre_encode_optimize():
     plt.ylim(0, 105)
     plt.plot(bit_1_count, results_off, c="blue")
     plt.plot(bit_1_count, results_off, "o", label="Encoding: off", c="blue")
-    plt.plot(bit_1_count, results_on, c="orange")
-    plt.plot(bit_1_count, results_on, "o", label="Encoding: on", c="orange")
+    plt.plot(bit_1_count_on, results_on, c="orange")
+    plt.plot(bit_1_count_on, results_on, "o", label="Encoding: on", c="orange")
     plt.legend()
     if save_figs:
         plt.savefig("results/figures/error_correction bit flip.pdf", bbox_inches="tight")
@@ -75,13 +81,13 @@ def plot_pre_encode_optimize():
 
 def plot_package_length():
     # Plot the data of the accuracy of increasing package lengths
-    plot_preset("results/FakeCusco/package_length.txt", "package length",
+    plot_preset("package_length", "package_length", "package length",
                 "Package length", [0, 6, 12, 18, 24, 30])
 
 
 def plot_repetitions():
     # Plot the data of the accuracy of increasing repetition counts
-    plot_preset("results/FakeCusco/repetitions.txt", "repetitions",
+    plot_preset("repetitions", lambda metadata: metadata["correction"][1], "repetitions",
                 "Repetitions", [1, 3, 5, 7])
 
 
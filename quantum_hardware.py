@@ -21,70 +21,372 @@
 # observables = [SparsePauliOp(label) for label in observables_labels]
 
 
-from qiskit import transpile
-from qiskit_ibm_runtime import QiskitRuntimeService, SamplerV2 as Sampler
-from qiskit.primitives import PrimitiveResult
+import asyncio
+import inspect
+import time
+from contextlib import contextmanager
+
+from qiskit_ibm_runtime import Batch, QiskitRuntimeService, SamplerV2 as Sampler, Session
+from qiskit_ibm_runtime.fake_provider.local_service import QiskitRuntimeLocalService
+from qiskit.primitives import BitArray, PrimitiveResult
+import numpy as np
 import circuit
+import job_cache
+import transpile_cache
 
 
 class ExperimentResult:
     bitstring: str
     fidelity: float
     detailed_results: list[tuple[str, float]]
+    marginals: np.ndarray | None
 
     def __init__(
-        self, bitstring: str, fidelity: float, detailed_results: list[tuple[str, float]]
+        self,
+        bitstring: str,
+        fidelity: float,
+        detailed_results: list[tuple[str, float]],
+        marginals: np.ndarray | None = None,
     ):
         self.bitstring = bitstring
         self.fidelity = fidelity
         self.detailed_results = detailed_results
+        # Probability of measuring a 1 for every bit of the message, in message order
+        self.marginals = marginals
 
 
 # You'll need to specify the credentials when initializing QiskitRuntimeService, if they were not previously saved.
-def run(bitstring: str, package_size: int, shots: int = 1024) -> ExperimentResult:
-    service = QiskitRuntimeService(
-        channel='ibm_quantum',
-        instance='ibm-q/open/main',
-        token=''
-    )
-    backend = service.backend("ibm_sherbrooke")
-    # backend = service.least_busy()
+# These options are used to submit new jobs, while previous jobs are fetched with the saved account.
+default_service_options = {
+    "channel": "ibm_quantum",
+    "instance": "ibm-q/open/main",
+    "token": "",
+}
+
+
+class RuntimeClient:
+    """Keeps a runtime service and its backends alive across submissions
+
+    Connecting to the service and fetching a backend's configuration and target happens once per client instead of
+    once per call. Reusing the same backend object also lets transpile_cache reuse its backend fingerprint. Submissions
+    made inside batch() are grouped into a single runtime batch (or session).
+
+    Attributes:
+        backend_name (str): Backend used when no other backend is given
+        service_options (dict): Options to connect to QiskitRuntimeService with, when no service was given. Without any,
+            the saved account is used.
+    """
+
+    backend_name: str
+    service_options: dict
+
+    def __init__(self, service=None, backend_name: str = "ibm_sherbrooke", **service_options):
+        """
+        Args:
+            service (optional): Service to use, e.g. a QiskitRuntimeLocalService to run on fake backends. Defaults to
+                connecting to QiskitRuntimeService on first use.
+            backend_name (str, optional): Backend used when no other backend is given. Defaults to "ibm_sherbrooke".
+            **service_options: Options to connect with. Defaults to none, which uses the saved account.
+        """
+        self._service = service
+        self.backend_name = backend_name
+        self.service_options = service_options
+        self._backends: dict = {}
+        self._mode = None
+
+    @property
+    def service(self):
+        if self._service is None:
+            self._service = QiskitRuntimeService(**self.service_options)
+        return self._service
+
+    def backend(self, name: str = None):
+        """Returns the backend with the given name, fetching it only the first time"""
+        name = self.backend_name if name is None else name
+        if name not in self._backends:
+            backend = self.service.backend(name)
+            # Build the target now, so the first transpile does not pay for it
+            backend.target
+            self._backends[name] = backend
+        return self._backends[name]
+
+    @contextmanager
+    def batch(self, backend: str = None, session: bool = False):
+        """Groups every submission made inside the context into one runtime batch, or session with session set"""
+        mode_class = Session if session else Batch
+        target = self.backend(backend)
+        with mode_class(backend=target) as mode:
+            previous, self._mode = self._mode, (mode, target)
+            try:
+                yield mode
+            finally:
+                self._mode = previous
+
+    def submit(self, circuits: list, shots: int = 1024, backend: str = None):
+        """Transpiles the circuits for the backend and submits them as one sampler job
+
+        Args:
+            circuits (list): Circuits to run
+            shots (int, optional): Shots per circuit. Defaults to 1024.
+            backend (str, optional): Name of the backend. Defaults to backend_name, or the backend of the active batch.
+
+        Returns:
+            Returns the submitted job
+        """
+        if self._mode is None:
+            mode = target = self.backend(backend)
+        else:
+            mode, target = self._mode
+            if backend is not None and self.backend(backend) is not target:
+                raise ValueError(f"Invalid backend: the active batch runs on {target.name}, not {backend}")
+        transpiled = list(transpile_cache.cached_transpile(circ, target) for circ in circuits)
+
+        sampler = Sampler(mode=mode)
+        sampler.options.default_shots = shots
+        return sampler.run(transpiled)
+
+    def job(self, job_id: str):
+        return self.service.job(job_id)
+
+
+_default_clients: dict = {}
 
-    sampler = Sampler(backend)
-    sampler.options.default_shots = shots
 
+def default_client(**service_options) -> RuntimeClient:
+    # Client shared by every call that is not given its own, one per set of service options
+    key = tuple(sorted(service_options.items()))
+    if key not in _default_clients:
+        _default_clients[key] = RuntimeClient(**service_options)
+    return _default_clients[key]
+
+
+def submit(
+    bitstring: str, package_size: int, shots: int = 1024, client: RuntimeClient = None
+):
+    client = default_client(**default_service_options) if client is None else client
     circs = circuit.build_circuits(bitstring, package_size)
 
-    circs_transpiled = list(transpile(circ, backend) for circ in circs)
+    job = client.submit(circs, shots)
+    print(f"Job ID: {job.job_id()} on backend {job.backend().name}")
+
+    return job
+
+
+def run(
+    bitstring: str,
+    package_size: int,
+    shots: int = 1024,
+    decoder: str = "counts",
+    client: RuntimeClient = None,
+) -> ExperimentResult:
+    job = submit(bitstring, package_size, shots, client)
+    bit_arrays = job_cache.cached_bit_arrays(job.job_id(), job.result)
+
+    return _parse_bit_arrays(bit_arrays, package_size, shots, decoder)
+
+
+def fetch_previous_job(
+    job_id: str,
+    package_size: int,
+    shots: int = 1024,
+    decoder: str = "counts",
+    client: RuntimeClient = None,
+):
+    client = default_client() if client is None else client
+
+    # Jobs fetched before are parsed from the local job cache, without contacting the service
+    bit_arrays = job_cache.cached_bit_arrays(job_id, lambda: client.job(job_id).result())
+
+    return _parse_bit_arrays(bit_arrays, package_size, shots, decoder)
+
+
+async def wait_for_result(job, poll_interval: float = 10.0) -> PrimitiveResult:
+    # Polls the job without blocking the event loop, and returns its result once it has finished
+    while not await asyncio.to_thread(job.in_final_state):
+        await asyncio.sleep(poll_interval)
+    return await asyncio.to_thread(job.result)
+
+
+async def run_many_async(
+    bitstring: str,
+    package_sizes: list[int],
+    shots: int = 1024,
+    decoder: str = "counts",
+    client: RuntimeClient = None,
+    callback=None,
+    poll_interval: float = 10.0,
+) -> list[ExperimentResult]:
+    """Transmits the bitstring once for every package size, with all jobs queued at the same time
+
+    Every configuration is submitted up front in one batch, and the jobs are then polled concurrently, so their queue
+    times overlap instead of adding up.
+
+    Args:
+        bitstring (str): Message to transmit
+        package_sizes (list[int]): Package size of each configuration
+        shots (int, optional): Shots per circuit. Defaults to 1024.
+        decoder (str, optional): Decoder to parse the results with, see decoders. Defaults to "counts".
+        client (RuntimeClient, optional): Client to submit with. Defaults to the client of default_service_options.
+        callback (optional): Called with (package_size, result) as soon as a configuration has finished, and awaited
+            if it is a coroutine function
+        poll_interval (float, optional): Seconds between status checks of a job. Defaults to 10.
 
-    job = sampler.run(circs_transpiled)
-    print(f"Job ID: {job.job_id()} on backend {backend.name}")
-    results: PrimitiveResult = job.result()
+    Returns:
+        list[ExperimentResult]: Returns the results in the order of package_sizes. If any configuration failed, a
+            RuntimeError listing the failures is raised instead, once all other configurations have been handled.
+    """
+    client = default_client(**default_service_options) if client is None else client
 
-    return _parse_job_result(results, package_size, shots)
+    with client.batch():
+        jobs = list(submit(bitstring, package_size, shots, client) for package_size in package_sizes)
 
+    async def collect(package_size: int, job) -> ExperimentResult:
+        results = await wait_for_result(job, poll_interval)
+        bit_arrays = job_cache.cached_bit_arrays(job.job_id(), lambda: results)
+        result = _parse_bit_arrays(bit_arrays, package_size, shots, decoder)
+        if callback is not None:
+            outcome = callback(package_size, result)
+            if inspect.isawaitable(outcome):
+                await outcome
+        return result
 
-def fetch_previous_job(job_id: str, package_size: int, shots: int = 1024):
-    service = QiskitRuntimeService()
+    # A failed job does not stop the others: every other configuration is still collected before the failures are raised
+    results = await asyncio.gather(
+        *(collect(size, job) for size, job in zip(package_sizes, jobs)), return_exceptions=True
+    )
+    failures = list((size, result) for size, result in zip(package_sizes, results) if isinstance(result, BaseException))
+    if failures:
+        raise RuntimeError(
+            f"{len(failures)} of {len(package_sizes)} configurations failed: "
+            + ", ".join(f"package size {size} ({error!r})" for size, error in failures)
+        ) from failures[0][1]
+    return list(results)
+
+
+def run_many(bitstring: str, package_sizes: list[int], **options) -> list[ExperimentResult]:
+    # Blocking form of run_many_async
+    return asyncio.run(run_many_async(bitstring, package_sizes, **options))
+
+
+class QueuedJob:
+    """Local stand-in for a job waiting in a device queue
+
+    It reports itself as unfinished until its queue delay has passed, and otherwise behaves like the wrapped job.
+    """
+
+    def __init__(self, job, delay: float):
+        self._job = job
+        self._ready = time.monotonic() + delay
+
+    def in_final_state(self) -> bool:
+        return time.monotonic() >= self._ready and self._job.in_final_state()
+
+    def result(self):
+        time.sleep(max(self._ready - time.monotonic(), 0.0))
+        return self._job.result()
+
+    def __getattr__(self, name: str):
+        return getattr(self._job, name)
+
+
+class LocalQueueClient(RuntimeClient):
+    """RuntimeClient that runs on a local fake backend, with a simulated queue delay for every job
+
+    Attributes:
+        delays (list[float]): Queue delay in seconds of each submitted job in order, the last one repeating
+    """
+
+    delays: list[float]
+
+    def __init__(self, backend_name: str = "fake_sherbrooke", delays: float | list[float] = 1.0, service=None):
+        """
+        Args:
+            backend_name (str, optional): Name of the fake backend. Defaults to "fake_sherbrooke".
+            delays (float | list[float], optional): Queue delay in seconds of each submitted job in order, the last one
+                repeating. Defaults to 1.
+            service (optional): Local service to use. Defaults to a new QiskitRuntimeLocalService.
+        """
+        super().__init__(QiskitRuntimeLocalService() if service is None else service, backend_name)
+        self.delays = delays if isinstance(delays, list) else [delays]
+        self._submissions = 0
+
+    def submit(self, circuits: list, shots: int = 1024, backend: str = None):
+        job = super().submit(circuits, shots, backend)
+        delay = self.delays[min(self._submissions, len(self.delays) - 1)]
+        self._submissions += 1
+        return QueuedJob(job, delay)
+
+
+def unpack_bit_array(bit_array: BitArray) -> np.ndarray:
+    # Unpacks the shots of a sampler result to a uint8 (shots x bits) matrix, with the bits in the same order as the
+    # characters of the strings from get_counts. BitArray stores every shot big-endian, padded at the front.
+    packed = bit_array.array.reshape(-1, bit_array.array.shape[-1])
+    return np.unpackbits(packed, axis=1)[:, packed.shape[1] * 8 - bit_array.num_bits:]
 
-    job = service.job(job_id)
-    results: PrimitiveResult = job.result()
 
-    return _parse_job_result(results, package_size, shots)
+def bit_marginals(bit_array: BitArray) -> np.ndarray:
+    # Probability of measuring a 1 for every bit, counted on the packed bytes without building any strings
+    packed = bit_array.array.reshape(-1, bit_array.array.shape[-1])
+    shifts = np.arange(7, -1, -1, dtype=np.uint8)
+    ones = ((packed[:, :, np.newaxis] >> shifts) & 1).sum(axis=0, dtype=np.int64).reshape(-1)
+
+    return ones[ones.size - bit_array.num_bits:] / packed.shape[0]
+
+
+def decode_counts(bit_array: BitArray) -> tuple[str, float]:
+    # Picks the most frequent full-width outcome, and the fraction of shots it was measured in. Ties go to the outcome
+    # measured first, as with max over get_counts.
+    packed = np.ascontiguousarray(bit_array.array.reshape(-1, bit_array.array.shape[-1]))
+    rows = packed.view(np.dtype((np.void, packed.shape[1]))).reshape(-1)
+    unique, first, counts = np.unique(rows, return_index=True, return_counts=True)
+
+    best = np.flatnonzero(counts == counts.max())
+    best = best[np.argmin(first[best])]
+    bits = unpack_bit_array(bit_array)[first[best]]
+
+    return (bits + ord("0")).tobytes().decode("ascii"), counts[best] / packed.shape[0]
+
+
+def decode_majority(bit_array: BitArray) -> tuple[str, float]:
+    # Decides every bit on its own by majority vote over the shots. Unlike decode_counts, this still recovers the
+    # message when noise makes (almost) every full-width outcome unique, as it does for wide packages. The fidelity is
+    # the average fraction of shots that agree with the decided bits.
+    marginals = bit_marginals(bit_array)
+    bits = (marginals > 0.5).astype(np.uint8)
+
+    return (bits + ord("0")).tobytes().decode("ascii"), float(np.maximum(marginals, 1 - marginals).mean())
+
+
+decoders = {
+    "counts": decode_counts,
+    "majority": decode_majority,
+}
 
 
 def _parse_job_result(
-    results: PrimitiveResult, package_size: int, shots: int = 1024
+    results: PrimitiveResult, package_size: int, shots: int = 1024, decoder: str = "counts"
+) -> ExperimentResult:
+    return _parse_bit_arrays(
+        list(result.data.meas for result in results), package_size, shots, decoder
+    )
+
+
+def _parse_bit_arrays(
+    bit_arrays: list[BitArray], package_size: int, shots: int = 1024, decoder: str = "counts"
 ) -> ExperimentResult:
+    if decoder not in decoders:
+        raise ValueError(f"Invalid decoder: {decoder}")
+    decode = decoders[decoder]
+
+    # Fidelities are taken over the shots actually present in each result, so a job fetched with a different shots
+    # setting is still parsed correctly
     candidates: list[tuple[str, float]] = []
+    marginals: list[np.ndarray] = []
     avg_fidelity: float = 0.0
 
-    for result in results:
-        counts = result.data.meas.get_counts()
-
-        candidate: str = max(counts, key=counts.get)
-        candidate_count: int = counts[candidate]
-        fidelity: float = candidate_count / shots
+    for bit_array in bit_arrays:
+        candidate, fidelity = decode(bit_array)
+        marginals.append(bit_marginals(bit_array))
 
         # get the average fidelity waited by the length of the candidate compared to the package_size
         avg_fidelity += fidelity * (len(candidate) / package_size)
@@ -94,4 +396,6 @@ def _parse_job_result(
     avg_fidelity /= len(candidates)
     total_bitstring = "".join(candidate[0] for candidate in candidates)
 
-    return ExperimentResult(total_bitstring, avg_fidelity, candidates)
+    return ExperimentResult(
+        total_bitstring, avg_fidelity, candidates, np.concatenate(marginals)
+    )
@@ -0,0 +1,185 @@
+import json
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+# Binary store of experiment results. Every experiment is a directory under root holding an index.jsonl with one line
+# per run: its metadata (the settings of the run and scalar results such as its accuracy) and, when the per-shot
+# outcomes were kept, the name of a <id>.npy shard holding them packed along the bits (shots x ceil(bits / 8) uint8).
+# Runs are only ever appended, every index line is written with a single O_APPEND write so several processes can add
+# to one experiment at once, and shards are memory-mapped when read so only the shots actually used are loaded.
+
+root: Path = Path("results/store")
+
+
+class Record:
+    """A single run of an experiment
+
+    Attributes:
+        experiment (str): Name of the experiment the run belongs to
+        id (str): Identifier of the run within the experiment
+        metadata (dict): Settings and scalar results of the run
+        bits (int | None): Amount of bits per shot, or None if no outcomes were stored
+    """
+
+    experiment: str
+    id: str
+    metadata: dict
+    bits: int | None
+
+    def __init__(self, experiment: str, id: str, metadata: dict, bits: int | None = None, path: Path = None):
+        self.experiment = experiment
+        self.id = id
+        self.metadata = metadata
+        self.bits = bits
+        self._path = path
+
+    @property
+    def packed_outcomes(self) -> np.ndarray | None:
+        """Memory-mapped per-shot outcomes, packed most significant bit first (shots x ceil(bits / 8) uint8)"""
+        if self._path is None:
+            return None
+        return np.load(self._path, mmap_mode="r")
+
+    @property
+    def outcomes(self) -> np.ndarray | None:
+        """Per-shot outcomes as a uint8 (shots x bits) matrix, in the same layout as simulation.simulate with as_array"""
+        packed = self.packed_outcomes
+        if packed is None:
+            return None
+        return np.unpackbits(packed, axis=1, count=self.bits)
+
+    def __getitem__(self, key: str):
+        return self.metadata[key]
+
+    def __repr__(self) -> str:
+        return f"Record({self.experiment!r}, {self.id!r}, {self.metadata!r})"
+
+
+def _experiment_dir(experiment: str, store: Path | None) -> Path:
+    return Path(root if store is None else store) / experiment
+
+
+def append(experiment: str, metadata: dict, outcomes: np.ndarray = None, store: Path = None) -> Record:
+    """Adds a run to an experiment
+
+    Args:
+        experiment (str): Name of the experiment
+        metadata (dict): JSON serializable settings and scalar results of the run
+        outcomes (np.ndarray, optional): Per-shot outcomes as a (shots x bits) 0/1 matrix. Defaults to None.
+        store (Path, optional): Root directory of the store. Defaults to root.
+
+    Returns:
+        Record: Returns the added run
+    """
+    directory = _experiment_dir(experiment, store)
+    directory.mkdir(parents=True, exist_ok=True)
+    record_id = uuid.uuid4().hex
+    entry = {"id": record_id, "metadata": metadata}
+
+    path = None
+    if outcomes is not None:
+        outcomes = np.asarray(outcomes, dtype=np.uint8)
+        if outcomes.ndim != 2:
+            raise ValueError("Invalid outcomes: expected a (shots x bits) matrix")
+
+        # The shard is complete on disk before the index refers to it
+        path = directory / f"{record_id}.npy"
+        temporary = directory / f"{record_id}.tmp.npy"
+        np.save(temporary, np.packbits(outcomes, axis=1))
+        os.replace(temporary, path)
+        entry["bits"] = outcomes.shape[1]
+        entry["shard"] = path.name
+
+    line = (json.dumps(entry) + "\n").encode()
+    descriptor = os.open(directory / "index.jsonl", os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(descriptor, line)
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+    return Record(experiment, record_id, metadata, entry.get("bits"), path)
+
+
+def records(experiment: str, store: Path = None, **filters) -> list[Record]:
+    """Reads the runs of an experiment, without loading any outcomes
+
+    Args:
+        experiment (str): Name of the experiment
+        store (Path, optional): Root directory of the store. Defaults to root.
+        **filters: Only returns runs whose metadata has these values, e.g. backend="FakeCusco"
+
+    Returns:
+        list[Record]: Returns the matching runs in the order they were added
+    """
+    index = _experiment_dir(experiment, store) / "index.jsonl"
+    if not index.exists():
+        return []
+
+    result = []
+    with open(index) as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut off by a crash while it was being written
+                continue
+
+            metadata = entry["metadata"]
+            if any(metadata.get(key) != value for key, value in filters.items()):
+                continue
+
+            path = index.parent / entry["shard"] if "shard" in entry else None
+            result.append(Record(experiment, entry["id"], metadata, entry.get("bits"), path))
+
+    return result
+
+
+def table(experiment: str, x, y: str = "accuracy", store: Path = None, **filters) -> tuple[np.ndarray, np.ndarray]:
+    """Collects one scalar result of the runs of an experiment against one of their settings, e.g. for plotting
+
+    Args:
+        experiment (str): Name of the experiment
+        x: Metadata key of the setting, or a function computing it from the metadata
+        y (str, optional): Metadata key of the result. Defaults to "accuracy".
+        store (Path, optional): Root directory of the store. Defaults to root.
+        **filters: Only uses runs whose metadata has these values
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Returns the settings and results, sorted by setting. For a setting that was run
+            more than once, the latest run is used.
+    """
+    points = {}
+    for record in records(experiment, store, **filters):
+        key = x(record.metadata) if callable(x) else record.metadata[x]
+        points[key] = record.metadata[y]
+
+    keys = sorted(points)
+    return np.array(keys), np.array(list(points[key] for key in keys))
+
+
+def import_text(path: str | Path, experiment: str, x, y: str = "accuracy", store: Path = None,
+                **metadata) -> list[Record]:
+    """Adds the runs of a legacy two-column text result file (setting, result) to an experiment
+
+    Args:
+        path (str | Path): Text file written with np.savetxt
+        experiment (str): Name of the experiment
+        x: Metadata key of the setting in the first column, or a function turning that setting into a dictionary of
+            metadata
+        y (str, optional): Metadata key of the result in the second column. Defaults to "accuracy".
+        store (Path, optional): Root directory of the store. Defaults to root.
+        **metadata: Settings shared by every run in the file, e.g. backend="FakeCusco"
+
+    Returns:
+        list[Record]: Returns the added runs
+    """
+    runs = []
+    for setting, result in np.loadtxt(path, ndmin=2):
+        setting = int(setting) if setting.is_integer() else float(setting)
+        settings = x(setting) if callable(x) else {x: setting}
+        runs.append(append(experiment, {**metadata, **settings, y: float(result)}, store=store))
+    return runs
@@ -1,18 +1,55 @@
+import os
+
+import numpy as np
 from qiskit import QuantumCircuit, transpile
+from qiskit.circuit import Delay
+from qiskit_aer import AerSimulator
+
+import error_correction
+import pair_simulation
+import transpile_cache
+from packed_bits import PackedBits, as_bitstr, stack, to_array, unstack
+
+placeholder_label = "encode_"
+delay_placeholder_label = "delay"
+
+# Gates the stabilizer method simulates, and rotations it only simulates at multiples of pi/2
+stabilizer_gates = {"barrier", "measure", "reset", "delay", "id", "x", "y", "z", "h", "s", "sdg", "sx", "sxdg", "cx",
+                    "cy", "cz", "swap", "ecr", "pauli"}
+stabilizer_rotations = {"rz"}
+
+# Noise instructions the stabilizer method applies: Pauli errors, resets (e.g. relaxation with T2 <= T1) and readout
+stabilizer_noise = {"id", "x", "y", "z", "pauli", "reset", "roerror"}
 
+# Widest noisy circuit simulated as a density matrix (4^n entries). Wider circuits sample every shot separately, with
+# matrix product states, as the Bell pairs of a package are only entangled in pairs.
+density_matrix_max_qubits: int = 10
 
-def assert_bitstring(bitstring: str):
+# Noise instructions per noise model (by id, with the model kept alive) and the method choices already reported
+_noise_instructions: dict = {}
+_reported_methods: set = set()
+
+# Transpiled circuit templates, keyed by (package_length, delay_us, simulator), with delay_us None for templates with a
+# delay placeholder
+template_cache: dict = {}
+
+
+def assert_bitstring(bitstring: str | PackedBits):
     if len(bitstring) % 2 == 1:
         # Because superdense coding sends pairs of bits, the string should be an even numbered length
         raise ValueError("Invalid length: bitstring should be an even number of bits long")
+    if isinstance(bitstring, PackedBits):
+        # Packed bits can only hold 0 and 1 values
+        return
     for bit in bitstring:
         if bit != "0" and bit != "1":
             raise ValueError("Invalid content: bitstring can only contain 0 and 1 values")
 
 
-def assert_package_length(package_length: int):
-    if package_length > 28:
+def assert_package_length(package_length: int, max_length: int | None = 28):
+    if max_length is not None and package_length > max_length:
         # Because the qiskit simulation only supports up to 28 qubits, the package length cannot exceed 28 bits
+        # (engines that do not simulate the full package at once pass a different limit or None)
         raise ValueError("Invalid package length: packages should not exceed 28 bits")
     if package_length % 2 == 1:
         # Because superdense coding sends pairs of bits, the package length should be an even number
@@ -36,13 +73,28 @@ def encode_bit_pair(circuit: QuantumCircuit, bit_pair: str, index: int):
         circuit.x(index)
 
 
-def build_circuit(bitstring: str, delay_us: float = 0.0) -> QuantumCircuit:
-    # Reverse bitstring and check validity
-    bitstring = bitstring[::-1]
-    assert_bitstring(bitstring)
+def encode_placeholder(circuit: QuantumCircuit, index: int):
+    # Marks where the bit pair of a Bell-pair is encoded. The labelled barrier survives transpilation and follows its
+    # qubit through layout and routing, so it can be swapped for the encoding gates afterwards.
+    circuit.barrier(index, label=f"{placeholder_label}{index}")
 
+
+def delay_placeholder(circuit: QuantumCircuit):
+    # Marks where the delay goes, so one transpiled template serves every delay. The transpiler only accepts fixed
+    # delays, so a parameterized Delay cannot be used instead.
+    circuit.barrier(label=delay_placeholder_label)
+
+
+def delay_operation(delay_us: float, simulator) -> Delay:
+    # The delay the transpiler would produce for delay_us: converted to the backend's time steps if it has them
+    dt = simulator.target.dt
+    if dt is None:
+        return Delay(delay_us, unit="us")
+    return Delay(round(delay_us * 1e-6 / dt), unit="dt")
+
+
+def _build_circuit(n: int, delay_us: float | None, encode) -> QuantumCircuit:
     # Initialize quantum circuit
-    n = len(bitstring)
     circuit = QuantumCircuit(n)
 
     # Build the circuit
@@ -51,13 +103,15 @@ def build_circuit(bitstring: str, delay_us: float = 0.0) -> QuantumCircuit:
         bell_state(circuit, i, i+1)
     circuit.barrier()
 
-    # Here, we can wait an arbitrary amount of time
-    if delay_us != 0.0:
+    # Here, we can wait an arbitrary amount of time (or mark the place for it, without delay_us)
+    if delay_us is None:
+        delay_placeholder(circuit)
+    elif delay_us != 0.0:
         circuit.delay(delay_us, unit="us")
 
     # Encode the bit pairs into the first qubit of every Bell-pair
     for i in range(0, n, 2):
-        encode_bit_pair(circuit, bitstring[i:i + 2], i)
+        encode(circuit, i)
     circuit.barrier()
 
     # Decode all the Bell-pairs and measure their states
@@ -68,60 +122,517 @@ def build_circuit(bitstring: str, delay_us: float = 0.0) -> QuantumCircuit:
     return circuit
 
 
-def build_circuits(bitstring: str, package_length: int, delay_us: float = 0.0) -> list:
-    # Check validity of package length
-    assert_package_length(package_length)
+def build_circuit(bitstring: str | PackedBits, delay_us: float = 0.0) -> QuantumCircuit:
+    # Reverse bitstring and check validity
+    bitstring = as_bitstr(bitstring)[::-1]
+    assert_bitstring(bitstring)
 
-    # Divide bits into equally sized packages (with the last bits as the remainder package)
-    packages = list(bitstring[i:i + package_length] for i in range(0, len(bitstring), package_length))
+    return _build_circuit(len(bitstring), delay_us, lambda circuit, i: encode_bit_pair(circuit, bitstring[i:i + 2], i))
 
-    # Build the circuits
-    return list(build_circuit(package, delay_us=delay_us) for package in packages)
+
+def build_circuit_template(package_length: int, delay_us: float | None = 0.0) -> QuantumCircuit:
+    # Builds the circuit shared by all packages of this length, with placeholders instead of the encoding gates (and
+    # instead of the delay, if delay_us is None)
+    return _build_circuit(package_length, delay_us, encode_placeholder)
 
 
-def build_circuit_transpiled(bits: str, simulator, delay_us: float = 0.0) -> QuantumCircuit:
-    circuit = build_circuit(bits, delay_us)
-    return transpile(circuit, simulator)
+def split_packages(bitstring: str | PackedBits, package_length: int) -> list:
+    # Divide bits into equally sized packages (with the last bits as the remainder package)
+    if isinstance(bitstring, PackedBits):
+        return bitstring.packets(package_length)
+    return list(bitstring[i:i + package_length] for i in range(0, len(bitstring), package_length))
 
 
-def build_circuits_transpiled(bits: str, package_length: int, simulator, delay_us: float = 0.0) -> list:
-    circuits = build_circuits(bits, package_length, delay_us)
-    return list(transpile(circuit, simulator) for circuit in circuits)
+def build_circuits(bitstring: str | PackedBits, package_length: int, delay_us: float = 0.0) -> list:
+    # Check validity of package length
+    assert_package_length(package_length)
 
+    # Build the circuits
+    return list(build_circuit(package, delay_us=delay_us) for package in split_packages(bitstring, package_length))
+
+
+class CircuitTemplate:
+    """Transpiled circuit shared by all packages of one length, delay and backend
+
+    The template is transpiled once with placeholders for the encoding gates. A package's circuit is then produced by
+    replacing each placeholder with the Z/X gates of its bit pair, already translated to the backend's basis gates and
+    placed on the physical qubit the placeholder was routed to. A template built without delay_us also has a
+    placeholder for the delay, which is filled in by build in the same way.
+    """
+
+    package_length: int
+    circuit: QuantumCircuit
+    encodings: dict[str, list]
+
+    def __init__(self, package_length: int, simulator, delay_us: float | None = 0.0):
+        self.package_length = package_length
+        self.simulator = simulator
+        self.circuit = transpile_cache.cached_transpile(build_circuit_template(package_length, delay_us), simulator)
+
+        # Translate the encoding gates of every bit pair to the basis gates of the backend
+        self.encodings = {}
+        for bit_pair in ["00", "01", "10", "11"]:
+            encoding = QuantumCircuit(1)
+            encode_bit_pair(encoding, bit_pair, 0)
+            encoding = transpile(encoding, simulator, optimization_level=0)
+            self.encodings[bit_pair] = list(instruction.operation for instruction in encoding.data)
+
+    def build(self, bitstring: str | PackedBits, delay_us: float = 0.0) -> QuantumCircuit:
+        """Builds the transpiled circuit of a single package
+
+        Args:
+            bitstring (str | PackedBits): Package to encode
+            delay_us (float, optional): Delay in microseconds, for a template with a delay placeholder. Defaults to 0.
+
+        Returns:
+            QuantumCircuit: Returns the transpiled circuit
+        """
+        # Reverse bitstring and check validity
+        bitstring = as_bitstr(bitstring)[::-1]
+        assert_bitstring(bitstring)
+        if len(bitstring) != self.package_length:
+            raise ValueError("Invalid length: bitstring does not match the package length of the template")
+
+        circuit = self.circuit.copy_empty_like()
+        for instruction in self.circuit.data:
+            label = instruction.operation.label if instruction.operation.name == "barrier" else None
+            if label is not None and label.startswith(placeholder_label):
+                i = int(label[len(placeholder_label):])
+                for operation in self.encodings[bitstring[i:i + 2]]:
+                    circuit.append(operation, instruction.qubits)
+            elif label == delay_placeholder_label:
+                if delay_us != 0.0:
+                    delay = delay_operation(delay_us, self.simulator)
+                    for qubit in instruction.qubits:
+                        circuit.append(delay, [qubit])
+            else:
+                circuit.append(instruction)
+
+        return circuit
+
+
+def get_template(package_length: int, simulator, delay_us: float = 0.0) -> CircuitTemplate:
+    # Returns the cached template for this package length, delay and backend, transpiling it on first use
+    key = (package_length, delay_us, simulator)
+    if key not in template_cache:
+        template_cache[key] = CircuitTemplate(package_length, simulator, delay_us)
+    return template_cache[key]
+
+
+def build_circuit_transpiled(bits: str | PackedBits, simulator, delay_us: float = 0.0) -> QuantumCircuit:
+    # Check validity before a template of this length is transpiled
+    assert_bitstring(bits)
+    return get_template(len(bits), simulator, delay_us).build(bits)
+
+
+def build_circuits_transpiled(bits: str | PackedBits, package_length: int, simulator, delay_us: float = 0.0,
+                              use_templates: bool = True) -> list:
+    # Build the transpiled circuits from cached templates, so the transpiler only runs once per package length
+    if not use_templates:
+        circuits = build_circuits(bits, package_length, delay_us)
+        return list(transpile_cache.cached_transpile(circuit, simulator) for circuit in circuits)
 
-def simulate(simulator, circuits: list, shots: int=1) -> list:
-    # Simulate circuits and collect their results in a list.
-    results = list(
-        simulator.run(circuit, shots=shots, memory=True).result().get_memory(circuit)
-        for circuit in circuits
+    assert_package_length(package_length)
+    return list(
+        build_circuit_transpiled(package, simulator, delay_us) for package in split_packages(bits, package_length)
     )
 
-    # Reorder results into correct list of bitstrings
-    results = list(
-        "".join(result[i] for result in results)
-        for i in range(shots)
+
+def counts_to_array(counts: dict, width: int, rng: np.random.Generator=None) -> np.ndarray:
+    # Expands an outcome histogram into a (shots x width) matrix in random shot order. Shots of separate circuits are
+    # independent, so joining these rows across circuits gives the same distribution as joining per-shot memory.
+    outcomes = stack(list(counts.keys()))
+    matrix = np.repeat(outcomes.reshape(-1, width), list(counts.values()), axis=0)
+
+    rng = np.random.default_rng() if rng is None else rng
+    return matrix[rng.permutation(len(matrix))]
+
+
+def active_width(circuit: QuantumCircuit) -> int:
+    # Amount of qubits a circuit acts on. Aer only simulates these, not every qubit of the backend it was transpiled for.
+    return len(set(
+        qubit for instruction in circuit.data if instruction.operation.name != "barrier" for qubit in instruction.qubits
+    ))
+
+
+def is_clifford(circuit: QuantumCircuit) -> bool:
+    # Whether the stabilizer method can simulate every instruction of the circuit. The transpiler may split a Clifford
+    # gate into rotations that are not Clifford on their own, so transpiled circuits are checked gate by gate.
+    for instruction in circuit.data:
+        operation = instruction.operation
+        if operation.name in stabilizer_rotations:
+            quarter_turns = float(operation.params[0]) / (np.pi / 2)
+            if abs(quarter_turns - round(quarter_turns)) > 1e-8:
+                return False
+        elif operation.name not in stabilizer_gates:
+            return False
+    return True
+
+
+def _flatten_errors(errors) -> list:
+    # Noise models keep their errors in dictionaries by instruction (and by qubits, for local errors)
+    if isinstance(errors, dict):
+        return list(error for value in errors.values() for error in _flatten_errors(value))
+    return [errors]
+
+
+def noise_instructions(simulator) -> set | None:
+    # Names of the instructions the simulator's noise applies, or None if they are unknown. Fake backends build their
+    # noise model internally, which always holds relaxation errors.
+    if not isinstance(simulator, AerSimulator):
+        return None
+    model = simulator.options.noise_model
+    if model is None or model.is_ideal():
+        return set()
+
+    if id(model) not in _noise_instructions:
+        errors = _flatten_errors(model._default_quantum_errors) + _flatten_errors(model._local_quantum_errors)
+        names = set(
+            instruction.operation.name for error in errors for circuit in error.circuits for instruction in circuit.data
+        )
+        if model._default_readout_error is not None or model._local_readout_errors:
+            names.add("roerror")
+        _noise_instructions[id(model)] = (model, names)
+    return _noise_instructions[id(model)][1]
+
+
+def select_method(simulator, circuits: list) -> tuple[str, str]:
+    """Chooses the Aer simulation method for the circuits, from their gates and width and the simulator's noise
+
+    Clifford circuits with only Pauli, reset and readout noise use the stabilizer method. Other noisy circuits use a
+    density matrix up to density_matrix_max_qubits, and matrix product states when they are wider (instead of the
+    statevector fallback of Aer's automatic method, which samples every shot of a wide noisy circuit separately with
+    the full state). Noiseless circuits that are not Clifford use a statevector.
+
+    Args:
+        simulator: Simulator that runs the circuits
+        circuits (list): Circuits to run
+
+    Returns:
+        tuple[str, str]: Returns the method and the reason it was chosen
+    """
+    width = max((active_width(circuit) for circuit in circuits), default=0)
+    noise = noise_instructions(simulator)
+
+    if noise is not None and noise <= stabilizer_noise and all(is_clifford(circuit) for circuit in circuits):
+        return "stabilizer", "Clifford circuits with Pauli noise" if noise else "Clifford circuits without noise"
+    if noise == set():
+        return "statevector", "circuits without noise"
+    if width <= density_matrix_max_qubits:
+        return "density_matrix", f"noisy circuits of at most {density_matrix_max_qubits} qubits"
+    return "matrix_product_state", f"noisy circuits of more than {density_matrix_max_qubits} qubits"
+
+
+def parallel_options(simulator, method: str, circuits: list) -> dict:
+    # Divides the simulator's threads (every core, unless max_parallel_threads was set) over the experiments when there
+    # are several, and otherwise over the shots of a method that samples every shot separately
+    threads = getattr(simulator.options, "max_parallel_threads", None) or os.cpu_count() or 1
+    if threads == 1:
+        return {}
+    if len(circuits) > 1:
+        return {"max_parallel_experiments": min(len(circuits), threads)}
+    if method != "density_matrix":
+        return {"max_parallel_shots": threads}
+    return {}
+
+
+def execution_options(simulator, circuits: list, **run_options) -> dict:
+    """Completes the run options of the circuits with a simulation method and parallelism settings
+
+    The method is chosen with select_method, unless run_options already holds one. The first run of every method choice
+    is reported, with a warning when noisy circuits wider than density_matrix_max_qubits are simulated with a statevector.
+
+    Args:
+        simulator: Simulator that runs the circuits
+        circuits (list): Circuits to run
+        **run_options: Options for simulator.run, which take precedence over the chosen ones
+
+    Returns:
+        dict: Returns the options to run the circuits with
+    """
+    method = run_options.get("method")
+    if method is None:
+        method, reason = select_method(simulator, circuits)
+    else:
+        reason = "given"
+
+    width = max((active_width(circuit) for circuit in circuits), default=0)
+    name = getattr(simulator, "name", type(simulator).__name__)
+    if (name, method, width) not in _reported_methods:
+        _reported_methods.add((name, method, width))
+        print(f"Simulating {width}-qubit circuits on {name} with the {method} method ({reason})")
+        if method in ("statevector", "automatic") and noise_instructions(simulator) != set() \
+                and width > density_matrix_max_qubits:
+            print(f"Warning: {method} simulates every shot of noisy {width}-qubit circuits with the full state, which "
+                  f"is slow. Use the matrix_product_state method or the pairs engine instead.")
+
+    return {**parallel_options(simulator, method, circuits), **run_options, "method": method}
+
+
+def simulate_blocks(simulator, circuits: list, shots: int=1, memory: bool=True, chunk_size: int=None,
+                    max_parallel_experiments: int=None, max_parallel_shots: int=None, method: str=None) -> list:
+    # Simulate circuits and return one uint8 (shots x width) block per circuit, in circuit order.
+    # Without memory, each circuit's block is rebuilt from its counts rather than from one string per shot.
+    # All circuits are submitted as a single job, or as one job per chunk of chunk_size circuits. The simulation method
+    # and parallelism settings are chosen by execution_options unless given (0 lets Aer use every available core).
+    run_options = {}
+    if max_parallel_experiments is not None:
+        run_options["max_parallel_experiments"] = max_parallel_experiments
+    if max_parallel_shots is not None:
+        run_options["max_parallel_shots"] = max_parallel_shots
+    if method is not None:
+        run_options["method"] = method
+
+    chunk_size = chunk_size or max(len(circuits), 1)
+    blocks = []
+    for i in range(0, len(circuits), chunk_size):
+        chunk = circuits[i:i + chunk_size]
+        options = execution_options(simulator, chunk, **run_options)
+        result = simulator.run(chunk, shots=shots, memory=memory, **options).result()
+
+        # Experiments come back in submission order, so indexing them keeps the packet order
+        for j, circuit in enumerate(chunk):
+            if memory:
+                blocks.append(stack(result.get_memory(j)))
+            else:
+                blocks.append(counts_to_array(result.get_counts(j), circuit.num_clbits))
+
+    return blocks
+
+
+def simulate(simulator, circuits: list, shots: int=1, packed: bool=False, as_array: bool=False,
+             **run_options) -> list | np.ndarray:
+    # Simulate circuits and collect their results as a list of bitstrings (or PackedBits), one per shot. With as_array,
+    # the results are returned as a uint8 (shots x total_bits) matrix instead, packed along the bits if packed is set.
+    # Other options (memory, chunk_size, max_parallel_*) are passed on to simulate_blocks.
+    blocks = simulate_blocks(simulator, circuits, shots, **run_options)
+
+    # build_circuit reverses each package, so Aer's outcome strings are already in message order and the blocks of
+    # consecutive packages can be joined side by side
+    matrix = np.hstack(blocks) if blocks else np.zeros((shots, 0), dtype=np.uint8)
+
+    if as_array:
+        return np.packbits(matrix, axis=1) if packed else matrix
+    return unstack(matrix, packed)
+
+
+def dedup_packages(packages: list) -> tuple[list, np.ndarray, np.ndarray]:
+    # Finds the unique packages, the index of the unique package for every package and how often each one occurs
+    index = {}
+    inverse = np.array(list(index.setdefault(package, len(index)) for package in packages), dtype=int)
+    multiplicity = np.bincount(inverse, minlength=len(index))
+    return list(index), inverse, multiplicity
+
+
+def print_dedup_ratio(packages: list, unique: list):
+    print(f"Simulating {len(unique)} unique of {len(packages)} packages "
+          f"(dedup ratio {len(packages) / max(len(unique), 1):.2f})")
+
+
+def simulate_packages(simulator, bitstring: str | PackedBits, package_length: int, shots: int, delay_us: float=0.0,
+                      dedup: bool=True, **run_options) -> np.ndarray:
+    # Simulate the circuits of all packages and return a uint8 (shots x bits) matrix. With dedup, every unique package
+    # is simulated once: a package that occurs k times runs with k * shots shots and each copy gets its own, independent
+    # slice of those shots. Packages occurring equally often are submitted together as one job.
+    if not dedup:
+        circuits = build_circuits_transpiled(bitstring, package_length, simulator, delay_us)
+        return simulate(simulator, circuits, shots, as_array=True, **run_options)
+
+    assert_package_length(package_length)
+    packages = split_packages(bitstring, package_length)
+    unique, inverse, multiplicity = dedup_packages(packages)
+    print_dedup_ratio(packages, unique)
+
+    matrix = np.zeros((shots, len(bitstring)), dtype=np.uint8)
+    starts = np.arange(len(packages)) * package_length
+    for copies in np.unique(multiplicity):
+        group = np.flatnonzero(multiplicity == copies)
+        circuits = list(
+            build_circuit_transpiled(unique[i], simulator, delay_us) for i in group
+        )
+        blocks = simulate_blocks(simulator, circuits, int(shots * copies), **run_options)
+
+        # Scatter the shots of every unique package back to its copies
+        for i, block in zip(group, blocks):
+            block = block.reshape(copies, shots, -1)
+            for copy, start in enumerate(starts[inverse == i]):
+                matrix[:, start:start + block.shape[2]] = block[copy]
+
+    return matrix
+
+
+def split_counts(counts: dict, copies: int, rng: np.random.Generator=None) -> list[dict]:
+    # Deals the shots of a histogram out over equally sized, independent histograms, as if the shots were shuffled and
+    # cut into copies parts
+    if copies == 1:
+        return [counts]
+
+    rng = np.random.default_rng() if rng is None else rng
+    outcomes = list(counts)
+    remaining = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    size = int(remaining.sum()) // copies
+
+    parts = []
+    for _ in range(copies - 1):
+        drawn = rng.multivariate_hypergeometric(remaining, size)
+        remaining -= drawn
+        parts.append(drawn)
+    parts.append(remaining)
+
+    return list(
+        {outcome: int(count) for outcome, count in zip(outcomes, part) if count} for part in parts
     )
 
-    return results
+
+def simulate_package_counts(simulator, bitstring: str | PackedBits, package_length: int, shots: int,
+                            delay_us: float=0.0, ideal: bool=None, seed: int=None, dedup: bool=True,
+                            **run_options) -> list[dict]:
+    # Simulate the circuits of all packages without per-shot memory and return one outcome histogram per package, in
+    # message order. Packages are independent of each other, so these histograms hold everything per-bit metrics need,
+    # while memory scales with the amount of distinct outcomes instead of with the shots. As in simulate_packages,
+    # every unique package is simulated once (unless dedup is off), and its shots are split over its copies.
+    assert_package_length(package_length, max_length=None if ideal else 28)
+    packages = split_packages(bitstring, package_length)
+    if ideal is None:
+        ideal = is_ideal(simulator)
+    if ideal:
+        return list({as_bitstr(package): shots} for package in packages)
+
+    if dedup:
+        unique, inverse, multiplicity = dedup_packages(packages)
+        print_dedup_ratio(packages, unique)
+    else:
+        unique, inverse, multiplicity = packages, np.arange(len(packages)), np.ones(len(packages), dtype=int)
+    rng = np.random.default_rng(seed)
+    histograms = [None] * len(packages)
+    for copies in np.unique(multiplicity):
+        group = np.flatnonzero(multiplicity == copies)
+        circuits = list(build_circuit_transpiled(unique[i], simulator, delay_us) for i in group)
+        options = execution_options(simulator, circuits, **run_options)
+        result = simulator.run(circuits, shots=int(shots * copies), memory=False, **options).result()
+
+        for j, i in enumerate(group):
+            for copy, counts in zip(np.flatnonzero(inverse == i), split_counts(result.get_counts(j), copies, rng)):
+                histograms[copy] = counts
+
+    return histograms
+
+
+def simulate_delays(simulator, bitstring: str | PackedBits, package_length: int, delays_us: list, shots: int,
+                    seed: int=None, **run_options) -> list[list[dict]]:
+    # Simulate the transmission of the bitstring for every delay and return, per delay, one outcome histogram per
+    # package (as simulate_package_counts). The circuits are transpiled once per package length with a placeholder for
+    # the delay, which is then filled in for every delay, and all (delay, package) experiments run in one batch per
+    # amount of copies of a package (see simulate_package_counts), instead of one transpile and run per delay.
+    assert_package_length(package_length)
+    packages = split_packages(bitstring, package_length)
+    unique, inverse, multiplicity = dedup_packages(packages)
+    rng = np.random.default_rng(seed)
+
+    histograms = list([None] * len(packages) for _ in delays_us)
+    for copies in np.unique(multiplicity):
+        group = np.flatnonzero(multiplicity == copies)
+        circuits = list(
+            get_template(len(unique[i]), simulator, None).build(unique[i], delay_us)
+            for delay_us in delays_us for i in group
+        )
+        options = execution_options(simulator, circuits, **run_options)
+        result = simulator.run(circuits, shots=int(shots * copies), memory=False, **options).result()
+
+        for d in range(len(delays_us)):
+            for j, i in enumerate(group):
+                counts = result.get_counts(d * len(group) + j)
+                for copy, part in zip(np.flatnonzero(inverse == i), split_counts(counts, copies, rng)):
+                    histograms[d][copy] = part
+
+    return histograms
+
+
+def is_ideal(simulator) -> bool:
+    # Only a plain AerSimulator without (or with an empty) noise model decodes every circuit deterministically. Fake
+    # backends and simulators built from a backend always carry noise.
+    if not isinstance(simulator, AerSimulator):
+        return False
+    noise_model = simulator.options.noise_model
+    return noise_model is None or noise_model.is_ideal()
+
+
+def simulate_ideal(bitstring: str | PackedBits, package_length: int, shots: int, simulator=None,
+                   validate: bool=False) -> np.ndarray:
+    # Without noise, superdense coding decodes every sent bit pair exactly, so each shot equals the bitstring. The
+    # circuits are only built and simulated (one shot) with validate, to check that closed form against Aer.
+    assert_package_length(package_length, max_length=None)
+    assert_bitstring(bitstring)
+    bits = to_array(bitstring)
+    matrix = np.tile(bits, (shots, 1))
+
+    if validate:
+        simulator = AerSimulator() if simulator is None else simulator
+        circuits = build_circuits_transpiled(bitstring, package_length, simulator)
+        if not np.array_equal(simulate(simulator, circuits, 1, as_array=True)[0], bits):
+            raise RuntimeError("Ideal result does not match the simulated circuits")
+
+    return matrix
 
 
-def simulate_full(simulator, bitstring: str, package_length: int, shots: int, correction_methods: list=None) -> list:
+def simulate_full(simulator, bitstring: str | PackedBits, package_length: int, shots: int,
+                  correction_methods: list=None, as_array: bool=False, engine: str="circuits",
+                  ideal: bool=None, validate: bool=False, dedup: bool=True, counts: bool=False,
+                  **run_options) -> list | np.ndarray:
     # Build the circuits using specified error correction methods, simulate them and collect their results in a list.
-    if correction_methods is None:
+    # Results are returned in the same payload form (str or PackedBits) as the given bitstring, or as a uint8
+    # (shots x bits) matrix with as_array. The "pairs" engine simulates every Bell pair on its own (see
+    # pair_simulation) and is not limited to 28-bit packages. Other options are passed on to simulate, or to
+    # pair_simulation.simulate_pairs for the "pairs" engine. The Aer method is chosen per run by execution_options,
+    # unless one is given with method.
+    # For an ideal simulator (detected with is_ideal unless ideal is given) the result is computed in closed form
+    # without building any circuits, see simulate_ideal. With dedup, identical packages are only simulated once, see
+    # simulate_packages. With counts, no per-shot results are kept at all and one outcome histogram per package is
+    # returned instead, see simulate_package_counts.
+    if counts:
+        if correction_methods:
+            raise ValueError("Invalid correction methods: decoding needs per-shot results, which counts does not keep")
+        if engine != "circuits":
+            raise ValueError(f"Invalid engine: counts is only supported by the circuits engine, not {engine}")
+        return simulate_package_counts(
+            simulator, bitstring, package_length, shots, ideal=ideal, dedup=dedup, **run_options
+        )
+
+    if not correction_methods:
         encode_methods, decode_methods, args = [], [], []
     else:
         encode_methods, decode_methods, args = zip(*correction_methods)
 
+    packed = isinstance(bitstring, PackedBits)
+
     # Encode the bitstring using specified encoding methods
     for method, arg in zip(encode_methods, args):
         bitstring = method(bitstring, *arg)
 
     # Build and simulate circuits and collect their results
-    circuits = build_circuits_transpiled(bitstring, package_length, simulator)
-    results = simulate(simulator, circuits, shots)
+    if ideal is None:
+        ideal = is_ideal(simulator)
+
+    if ideal:
+        matrix = simulate_ideal(bitstring, package_length, shots, simulator, validate)
+    elif engine == "pairs":
+        matrix = pair_simulation.simulate_pairs(simulator, bitstring, package_length, shots, **run_options)
+    elif engine == "circuits":
+        matrix = simulate_packages(simulator, bitstring, package_length, shots, dedup=dedup, **run_options)
+    else:
+        raise ValueError(f"Invalid engine: {engine}")
+    results = None
 
-    # Decode the bitstring using specified decoding methods
+    # Decode the bitstring using specified decoding methods, on all shots at once where a batched form exists
     for method, arg in zip(decode_methods, args):
-        results = list(method(result, *arg) for result in results)
-
-    return results
+        batched_method = error_correction.get_batched(method)
+        if batched_method is not None:
+            matrix = batched_method(stack(results) if matrix is None else matrix, *arg)
+            results = None
+        else:
+            results = list(method(result, *arg) for result in (unstack(matrix, packed) if results is None else results))
+            matrix = None
+
+    if as_array:
+        return stack(results) if matrix is None else matrix
+    return unstack(matrix, packed) if results is None else results
@@ -0,0 +1,81 @@
+import os
+import pickle
+from pathlib import Path
+
+from qiskit_aer import AerSimulator
+from qiskit_aer.noise import NoiseModel
+from qiskit_ibm_runtime import fake_provider as q_fp
+
+import disk_cache
+import transpile_cache
+
+# Factory for fake backends and the Aer simulators derived from them. Both are created once per process, and the
+# noise model extracted from a backend is also kept on disk, keyed by the backend name and its calibration (the backend
+# fingerprint of transpile_cache), so new worker processes do not rebuild it.
+# Set QGP_NOISE_CACHE=0 to turn the disk cache off, or QGP_NOISE_CACHE_DIR to move it.
+
+enabled: bool = os.environ.get("QGP_NOISE_CACHE", "1") != "0"
+cache_dir: Path = Path(
+    os.environ.get("QGP_NOISE_CACHE_DIR", Path.home() / ".cache" / "quantum_group_project" / "noise")
+)
+
+_backends: dict = {}
+_simulators: dict = {}
+
+
+def backend(name: str):
+    """Returns the fake backend with the given class name from qiskit_ibm_runtime.fake_provider, e.g. "FakeCusco"
+
+    Args:
+        name (str): Class name of the fake backend
+
+    Returns:
+        Returns the backend, the same object for every call in this process
+    """
+    if name not in _backends:
+        if not hasattr(q_fp, name):
+            raise ValueError(f"Invalid backend: {name}")
+        _backends[name] = getattr(q_fp, name)()
+    return _backends[name]
+
+
+def _cached(kind: str, device, build):
+    # Loads a pickled object extracted from the backend, or builds and stores it
+    if not enabled:
+        return build()
+
+    path = cache_dir / f"{device.name}-{transpile_cache.backend_fingerprint(device)[:16]}.{kind}.pickle"
+    return disk_cache.cached(
+        path, build, pickle.load, lambda value, file: pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+    )
+
+
+def noise_model(device) -> NoiseModel:
+    # Returns the noise model of a backend, extracting it only once per calibration
+    return _cached("noise", device, lambda: NoiseModel.from_backend(device))
+
+
+def simulator(name: str, noise: bool = True) -> AerSimulator:
+    """Returns an Aer simulator of the fake backend with the given class name
+
+    Args:
+        name (str): Class name of the fake backend, e.g. "FakeAlgiers"
+        noise (bool, optional): Whether to simulate the backend's noise. Defaults to True.
+
+    Returns:
+        AerSimulator: Returns the simulator, the same object for every call in this process
+    """
+    key = (name, noise)
+    if key not in _simulators:
+        device = backend(name)
+        model = noise_model(device) if noise else None
+        _simulators[key] = AerSimulator.from_backend(device, noise_model=model)
+    return _simulators[key]
+
+
+def clear() -> None:
+    # Forgets the backends and simulators of this process and removes the disk cache
+    _backends.clear()
+    _simulators.clear()
+    for path in cache_dir.glob("*.pickle"):
+        path.unlink(missing_ok=True)
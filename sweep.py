@@ -0,0 +1,121 @@
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# Amount of cores each worker process of a running sweep may use, or None outside of a sweep's workers
+worker_threads: int | None = None
+
+
+def grid(**axes) -> list[dict]:
+    """Builds the cells of an experiment grid as the product of all axes
+
+    Args:
+        **axes: Values of each setting, e.g. backend=["FakeCusco"], package_length=[2, 4, 8]
+
+    Returns:
+        list[dict]: Returns one dictionary of settings per cell, with the last axis varying fastest
+    """
+    names = list(axes)
+    return list(dict(zip(names, values)) for values in itertools.product(*axes.values()))
+
+
+def cell_key(cell: dict) -> str:
+    # Identifies a cell by its settings, independent of their order
+    return json.dumps(cell, sort_keys=True)
+
+
+def load_checkpoint(checkpoint: str | Path) -> dict:
+    # Reads the results of all finished cells from a checkpoint file (one JSON line per cell)
+    results = {}
+    if not Path(checkpoint).exists():
+        return results
+
+    with open(checkpoint) as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut off by a crash while it was being written
+                continue
+            results[cell_key(entry["cell"])] = entry["result"]
+    return results
+
+
+def _init_worker(threads: int) -> None:
+    global worker_threads
+    worker_threads = threads
+
+
+def run_sweep(cells: list[dict], run, checkpoint: str | Path, workers: int = None, on_result=None) -> list:
+    """Runs every cell of a grid on a pool of worker processes, checkpointing each finished cell
+
+    Cells that already have a result in the checkpoint file are skipped, so an interrupted sweep resumes where it
+    stopped when it is started again. A cell that raises does not stop the others: every other cell is still run and
+    checkpointed, after which a RuntimeError lists the failed cells.
+
+    Args:
+        cells (list[dict]): Cells to run, see grid
+        run: Function taking a cell and returning a JSON serializable result. It runs in a worker process, so it
+            should be defined at module level.
+        checkpoint (str | Path): File the result of every finished cell is appended to
+        workers (int, optional): Amount of worker processes. Defaults to one per core. The cores are divided between
+            the workers, see worker_threads.
+        on_result (optional): Called with (cell, result) for every cell, right away for checkpointed cells and as
+            soon as the others finish
+
+    Returns:
+        list: Returns the results in the order of the cells
+    """
+    checkpoint = Path(checkpoint)
+    checkpoint.parent.mkdir(parents=True, exist_ok=True)
+    results = load_checkpoint(checkpoint)
+
+    pending = []
+    for cell in cells:
+        if cell_key(cell) in results:
+            if on_result is not None:
+                on_result(cell, results[cell_key(cell)])
+        elif cell not in pending:
+            pending.append(cell)
+
+    if pending:
+        cores = os.cpu_count() or 1
+        workers = workers or cores
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(max(1, cores // workers),))
+        with open(checkpoint, "a") as file, executor:
+            # Terminate a line cut off by a crash, so the next result starts on a line of its own
+            if file.tell() > 0 and not checkpoint.read_bytes().endswith(b"\n"):
+                file.write("\n")
+
+            futures = {executor.submit(run, cell): cell for cell in pending}
+
+            failures = []
+            for future in as_completed(futures):
+                cell = futures[future]
+                try:
+                    result = future.result()
+                except Exception as error:
+                    # A failing cell does not stop the others. It is reported at the end and runs again on resume.
+                    print(f"Cell {cell} failed: {error!r}")
+                    failures.append((cell, error))
+                    continue
+                results[cell_key(cell)] = result
+
+                # Make the result durable before moving on, so it survives a crash in a later cell
+                file.write(json.dumps({"cell": cell, "result": result}) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+                if on_result is not None:
+                    on_result(cell, result)
+
+        if failures:
+            raise RuntimeError(
+                f"{len(failures)} of {len(pending)} cells failed, the others were checkpointed: "
+                + ", ".join(f"{cell} ({error!r})" for cell, error in failures)
+            ) from failures[0][1]
+
+    return list(results[cell_key(cell)] for cell in cells)
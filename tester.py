@@ -1,9 +1,12 @@
-from qiskit_ibm_runtime import fake_provider as q_fp
-from statistics import mean
+from statistics import NormalDist
 import numpy as np
 
 import simulation
 import error_correction
+import results_store
+import simulators
+import sweep
+from packed_bits import PackedBits, stack, to_array, unstack
 
 
 def string_comparison(bitstring: str, result: str) -> float:
@@ -13,131 +16,389 @@ def string_comparison(bitstring: str, result: str) -> float:
     return sum(0 if bit1 != bit2 else 1 for bit1, bit2 in zip(bitstring, result)) / len(bitstring)
 
 
+def outcome_matrix(results: np.ndarray | list | dict) -> tuple[np.ndarray, np.ndarray]:
+    # Brings the results of a simulation into one form for the metrics below: a uint8 (outcomes x bits) matrix and the
+    # amount of shots of each outcome. Results can be a (shots x bits) array as returned by simulate_full with as_array,
+    # a list of payloads (str or PackedBits) or a counts histogram. Most metrics also take the list of per-package
+    # histograms returned by simulate_full with counts.
+    if isinstance(results, dict):
+        return stack(list(results)), np.fromiter(results.values(), dtype=np.int64, count=len(results))
+    matrix = results if isinstance(results, np.ndarray) else stack(list(results))
+    return matrix, np.ones(len(matrix), dtype=np.int64)
+
+
+def _errors(bitstring: str | PackedBits, results: np.ndarray | list | dict) -> tuple[np.ndarray, np.ndarray]:
+    # Marks every bit of every outcome that differs from the bitstring, along with the weights of the outcomes
+    matrix, weights = outcome_matrix(results)
+    bits = to_array(bitstring)
+    if matrix.ndim != 2 or matrix.shape[1] != len(bits):
+        raise ValueError("Both strings should be the same length")
+    if weights.sum() == 0:
+        raise ValueError("Invalid results: there should be at least one shot")
+    return matrix != bits, weights
+
+
+def is_packet_counts(results: np.ndarray | list | dict) -> bool:
+    # Whether results are the per-package histograms of simulate_full with counts
+    return isinstance(results, list) and len(results) > 0 and isinstance(results[0], dict)
+
+
+def split_packets(bitstring: str | PackedBits, packet_counts: list[dict]) -> list[tuple]:
+    # Pairs every package histogram with the part of the bitstring it covers
+    lengths = list(len(next(iter(counts))) for counts in packet_counts)
+    if sum(lengths) != len(bitstring):
+        raise ValueError("Both strings should be the same length")
+
+    starts = np.cumsum([0] + lengths)
+    return list(
+        (bitstring[start:start + length], counts) for start, length, counts in zip(starts, lengths, packet_counts)
+    )
+
+
+def error_profile(bitstring: str | PackedBits, results: np.ndarray | list | dict) -> np.ndarray:
+    # Determines the error rate of each bit position over all shots. Per-package histograms give the exact same profile,
+    # as every bit position lies in a single package.
+    if is_packet_counts(results):
+        return np.concatenate(list(error_profile(bits, counts) for bits, counts in split_packets(bitstring, results)))
+
+    errors, weights = _errors(bitstring, results)
+    return (weights @ errors) / weights.sum()
+
+
+def bit_error_rate(bitstring: str | PackedBits, results: np.ndarray | list | dict) -> float:
+    # Determines the fraction of all received bits that differ from the original bitstring
+    return float(error_profile(bitstring, results).mean())
+
+
+def mean_similarity(bitstring: str | PackedBits, results: np.ndarray | list | dict) -> float:
+    # Determines the average Hamming similarity of the shots to the original bitstring (0 <= similarity <= 1), the same
+    # value as accuracy_method_1
+    return 1.0 - bit_error_rate(bitstring, results)
+
+
+def exact_match_rate(bitstring: str | PackedBits, results: np.ndarray | list | dict) -> float:
+    # Determines the fraction of shots that match the original bitstring exactly, the same value as accuracy_method_2.
+    # For per-package histograms, this is the product of the exact match rates of the independent packages.
+    if is_packet_counts(results):
+        rates = list(exact_match_rate(bits, counts) for bits, counts in split_packets(bitstring, results))
+        return float(np.prod(rates))
+
+    errors, weights = _errors(bitstring, results)
+    return float(weights[~errors.any(axis=1)].sum() / weights.sum())
+
+
+def _error_moments(bitstring: str | PackedBits, results: np.ndarray | list | dict) -> tuple[float, float, int]:
+    # Mean and sample variance of the amount of wrong bits per shot, and the amount of shots
+    errors, weights = _errors(bitstring, results)
+    wrong = errors.sum(axis=1)
+    shots = int(weights.sum())
+    mean_errors = float(weights @ wrong) / shots
+    variance = float(weights @ (wrong - mean_errors) ** 2) / max(shots - 1, 1)
+    return mean_errors, variance, shots
+
+
+def similarity_interval(bitstring: str | PackedBits, results: np.ndarray | list | dict,
+                        confidence: float=0.95) -> tuple[float, float]:
+    # Determines the mean similarity together with the half width of its (normal approximation) confidence interval,
+    # which stays above zero at an accuracy of 0 or 1, see below. For per-package histograms, the variance of the per-shot errors is the sum of the variances of the independent
+    # packages.
+    if is_packet_counts(results):
+        moments = list(_error_moments(bits, counts) for bits, counts in split_packets(bitstring, results))
+        mean_errors, variance, shots = sum(m[0] for m in moments), sum(m[1] for m in moments), moments[0][2]
+    else:
+        mean_errors, variance, shots = _error_moments(bitstring, results)
+
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    rate = mean_errors / len(bitstring)
+    halfwidth = z * np.sqrt(variance / shots) / len(bitstring)
+
+    # The normal approximation collapses to zero when no (or only) errors were seen, so the half width is never taken
+    # below that of the Wilson score interval on the per-bit error rate
+    trials = shots * len(bitstring)
+    wilson = z / (1 + z * z / trials) * np.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials))
+    return 1.0 - rate, float(max(halfwidth, wilson))
+
+
+def majority_settled(packet_counts: list[dict], confidence: float=0.95) -> bool:
+    # Whether the most frequent outcome of every package is significantly more frequent than the runner-up, so that
+    # majority decoding per package (as in quantum_hardware) would no longer change with more shots
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    for counts in packet_counts:
+        first, second = (sorted(counts.values(), reverse=True) + [0])[:2]
+        if first - second <= z * np.sqrt(first + second):
+            return False
+    return True
+
+
+def histogram(results: np.ndarray | list | dict) -> dict:
+    # Counts the occurrence of each unique outcome, with the outcomes as '0'/'1' strings
+    if is_packet_counts(results):
+        raise ValueError("Invalid results: per-package histograms do not hold the joint outcomes of all packages")
+    matrix, weights = outcome_matrix(results)
+    if isinstance(results, dict) or len(matrix) == 0:
+        return dict(zip(unstack(matrix), weights.tolist()))
+
+    # Outcomes are compared in packed form: as one big-endian 64-bit key each when they fit, otherwise as raw bytes
+    packed = np.packbits(matrix, axis=1)
+    width = packed.shape[1]
+    if width <= 8:
+        keys = np.zeros((len(packed), 8), dtype=np.uint8)
+        keys[:, :width] = packed
+        unique, counts = np.unique(keys.view(">u8").reshape(-1), return_counts=True)
+        unique = unique.astype(">u8").view(np.uint8).reshape(-1, 8)[:, :width]
+    else:
+        keys = np.ascontiguousarray(packed).view(np.dtype((np.void, width))).reshape(-1)
+        unique, counts = np.unique(keys, return_counts=True)
+        unique = unique.view(np.uint8).reshape(-1, width)
+
+    return dict(zip(unstack(np.unpackbits(unique, axis=1, count=matrix.shape[1])), counts.tolist()))
+
+
 def accuracy_method_1(bitstring: str, results: list) -> float:
     # For each result, determines similarity to the original bitstring and takes the average of all similarities
-    return mean(list(string_comparison(bitstring, result) for result in results))
+    return mean_similarity(bitstring, results)
 
 
 def accuracy_method_2(bitstring: str, results: list) -> float:
     # Counts the amount of perfect matches in results to the original bitstring and divides by the total result amount
-    return results.count(bitstring) / len(results)
+    return exact_match_rate(bitstring, results)
 
 
 def results_to_dict(results: list) -> dict:
     # Counts occurrence of each unique entry in results and records it in a dictionary
-    return {value: results.count(value) for value in set(results)}
-
-
-def provider_accuracy():
-    # Test the accuracy of each of IBM's simulation backend with one bitstring, package length and shot amount
-    simulators = [q_fp.FakeAlgiers(), q_fp.FakeAlmadenV2(), q_fp.FakeAuckland(), q_fp.FakeBoeblingenV2(),
-                  q_fp.FakeBrisbane(), q_fp.FakeBrooklynV2(), q_fp.FakeCambridgeV2(), q_fp.FakeCusco(),
-                  q_fp.FakeGeneva(), q_fp.FakeGuadalupeV2(), q_fp.FakeHanoiV2(), q_fp.FakeJohannesburgV2(),
-                  q_fp.FakeKawasaki(), q_fp.FakeKolkataV2(), q_fp.FakeKyiv(), q_fp.FakeKyoto(), q_fp.FakeManhattanV2(),
-                  q_fp.FakeMelbourneV2(), q_fp.FakeMontrealV2(), q_fp.FakeMumbaiV2(), q_fp.FakeOsaka(),
-                  q_fp.FakeParisV2(), q_fp.FakePeekskill(), q_fp.FakePrague(), q_fp.FakePoughkeepsieV2(),
-                  q_fp.FakeQuebec(), q_fp.FakeRochesterV2(), q_fp.FakeSherbrooke(), q_fp.FakeSingaporeV2(),
-                  q_fp.FakeSydneyV2(), q_fp.FakeTorino(), q_fp.FakeTorontoV2(), q_fp.FakeWashingtonV2()]
-    bitstring = "01010101"
-    package_length = 8
-    shots = 1000000
-
-    # Prepare result arrays
-    backend_names = np.array([simulator.name for simulator in simulators])
-    results = np.zeros(len(simulators))
-
-    # Simulate and record results
-    for i, simulator in enumerate(simulators):
-        print(simulator.backend_name)
-        bitstring_results = simulation.simulate_full(simulator, bitstring, package_length, shots)
-        results[i] = accuracy_method_1(bitstring, bitstring_results)
-
-    # Save results
-    data = np.column_stack((backend_names, results))
-    np.savetxt("results/backends.txt", data, delimiter=", ", fmt="%s")
-
-
-def pre_coding_accuracy(correction_methods, filename):
+    return histogram(results)
+
+
+class AdaptiveResult:
+    accuracy: float
+    halfwidth: float
+    shots: int
+    converged: bool
+
+    def __init__(self, accuracy: float, halfwidth: float, shots: int, converged: bool):
+        self.accuracy = accuracy
+        self.halfwidth = halfwidth
+        self.shots = shots
+        self.converged = converged
+
+
+def merge_packet_counts(packet_counts: list[dict] | None, new_counts: list[dict]) -> list[dict]:
+    # Adds the per-package histograms of a new batch of shots to the ones collected so far
+    if packet_counts is None:
+        return new_counts
+    for counts, new in zip(packet_counts, new_counts):
+        for outcome, count in new.items():
+            counts[outcome] = counts.get(outcome, 0) + count
+    return packet_counts
+
+
+def adaptive_accuracy(simulator, bitstring: str | PackedBits, package_length: int, target: float=0.001,
+                      stop: str="interval", correction_methods: list=None, min_shots: int=1000,
+                      max_shots: int=1000000, growth: float=2.0, confidence: float=0.95,
+                      **options) -> AdaptiveResult:
+    # Determines the accuracy (accuracy_method_1) of a transmission with as few shots as needed. Shots are run in
+    # batches, growing the total by the growth factor each time, until the stop criterion is met or max_shots is used:
+    # "interval" stops once the confidence interval on the accuracy is at most target wide on either side, "majority"
+    # once majority decoding of every package is settled (see majority_settled). Without correction methods the batches
+    # run in counts mode, so only per-package histograms are kept. Other options are passed on to simulate_full.
+    if stop not in ("interval", "majority"):
+        raise ValueError(f"Invalid stop criterion: {stop}")
+    if stop == "majority" and correction_methods:
+        raise ValueError("Invalid stop criterion: majority needs per-package histograms, which decoding does not keep")
+
+    results = None
+    shots = 0
+    batch = min(min_shots, max_shots)
+    while True:
+        if correction_methods:
+            matrix = simulation.simulate_full(simulator, bitstring, package_length, batch, correction_methods,
+                                              as_array=True, **options)
+            results = matrix if results is None else np.vstack((results, matrix))
+        else:
+            packet_counts = simulation.simulate_full(simulator, bitstring, package_length, batch, counts=True,
+                                                     **options)
+            results = merge_packet_counts(results, packet_counts)
+        shots += batch
+
+        accuracy, halfwidth = similarity_interval(bitstring, results, confidence)
+        if stop == "interval":
+            converged = halfwidth <= target
+        else:
+            converged = majority_settled(results, confidence)
+
+        if converged or shots >= max_shots:
+            return AdaptiveResult(accuracy, halfwidth, shots, converged)
+        batch = min(max(int(shots * (growth - 1)), 1), max_shots - shots)
+
+
+# Names of IBM's simulation backends in qiskit_ibm_runtime.fake_provider
+backend_names = ["FakeAlgiers", "FakeAlmadenV2", "FakeAuckland", "FakeBoeblingenV2", "FakeBrisbane", "FakeBrooklynV2",
+                 "FakeCambridgeV2", "FakeCusco", "FakeGeneva", "FakeGuadalupeV2", "FakeHanoiV2", "FakeJohannesburgV2",
+                 "FakeKawasaki", "FakeKolkataV2", "FakeKyiv", "FakeKyoto", "FakeManhattanV2", "FakeMelbourneV2",
+                 "FakeMontrealV2", "FakeMumbaiV2", "FakeOsaka", "FakeParisV2", "FakePeekskill", "FakePrague",
+                 "FakePoughkeepsieV2", "FakeQuebec", "FakeRochesterV2", "FakeSherbrooke", "FakeSingaporeV2",
+                 "FakeSydneyV2", "FakeTorino", "FakeTorontoV2", "FakeWashingtonV2"]
+
+
+# Correction methods by name, so sweep cells can refer to them as e.g. ["repetition", 3]
+correction_codecs = {
+    "repetition": (error_correction.repetition_encode, error_correction.repetition_decode),
+    "pre_coding": (error_correction.pre_coding_optimize_encode, error_correction.pre_coding_optimize_decode),
+}
+
+checkpoint_dir = "results/checkpoints"
+
+
+def correction_methods(correction: list | None) -> list | None:
+    # Translates the correction setting of a sweep cell into the correction methods of simulate_full
+    if correction is None:
+        return None
+    name, arg = correction
+    encode_method, decode_method = correction_codecs[name]
+    return [(encode_method, decode_method, [arg])]
+
+
+def sweep_grid(experiment: str, backend: list=None, package_length: list=None, correction: list=None,
+               delay_us: list=None, bitstring: list=None, shots: list=None, counts: bool=False,
+               target: float=None) -> list[dict]:
+    # Grid over backend x package_length x correction method x delay x bitstring, with the settings of the original
+    # experiments (FakeCusco, 8-bit packages, no correction, no delay, "01010101", 1M shots) for any axis not given.
+    # Every cell is stored as a run of the experiment in results_store. With counts, cells are simulated without keeping
+    # per-shot results (see simulation.simulate_full), which only works without correction methods. With a target, shots
+    # are allocated adaptively up to the shot amount of the cell, see adaptive_accuracy.
+    return sweep.grid(
+        experiment=[experiment],
+        backend=backend or ["FakeCusco"],
+        package_length=package_length or [8],
+        correction=correction or [None],
+        delay_us=delay_us or [0.0],
+        bitstring=bitstring or ["01010101"],
+        shots=shots or [1000000],
+        counts=[counts],
+        target=[target],
+    )
+
+
+def cell_accuracy(simulator, cell: dict) -> float:
+    # Simulates one cell of a sweep grid, determines its accuracy and stores the run with all of its shots, or only
+    # with its metrics when the cell is simulated in counts mode or with adaptive shots
+    settings = {key: value for key, value in cell.items() if key != "experiment"}
+    if cell.get("target") is not None:
+        result = adaptive_accuracy(simulator, cell["bitstring"], cell["package_length"], cell["target"],
+                                   correction_methods=correction_methods(cell["correction"]),
+                                   max_shots=cell["shots"], delay_us=cell["delay_us"])
+        metadata = {**settings, "accuracy": result.accuracy, "halfwidth": result.halfwidth,
+                    "shots_used": result.shots, "converged": result.converged}
+        results_store.append(cell["experiment"], metadata)
+        return result.accuracy
+
+    counts = cell.get("counts", False)
+    results = simulation.simulate_full(simulator, cell["bitstring"], cell["package_length"], cell["shots"],
+                                       correction_methods(cell["correction"]), as_array=not counts, counts=counts,
+                                       delay_us=cell["delay_us"])
+    profile = error_profile(cell["bitstring"], results)
+    accuracy = 1.0 - float(profile.mean())
+
+    metadata = {**settings, "accuracy": accuracy, "exact_match_rate": exact_match_rate(cell["bitstring"], results),
+                "error_profile": profile.tolist()}
+    results_store.append(cell["experiment"], metadata, None if counts else results)
+    return accuracy
+
+
+def accuracy_cell(cell: dict) -> float:
+    # Runs in a worker process: gets the simulator of the cell's backend (built once per process, with its noise model
+    # from the disk cache) and determines the accuracy of the cell. Aer uses only the worker's share of the cores, as
+    # every worker would otherwise start a thread per core.
+    simulator = simulators.simulator(cell["backend"])
+    if sweep.worker_threads is not None:
+        simulator.set_options(max_parallel_threads=sweep.worker_threads)
+    return cell_accuracy(simulator, cell)
+
+
+def print_cell(cell: dict, result) -> None:
+    print(cell, result)
+
+
+def provider_accuracy(workers: int=None, counts: bool=False, target: float=None):
+    # Test the accuracy of each of IBM's simulation backend with one bitstring, package length and shot amount. The
+    # backends are simulated in parallel by a pool of worker processes (one per core by default) and every result is
+    # stored as soon as it is finished, so completed backends survive a crash.
+    cells = sweep_grid("backends", backend=backend_names, counts=counts, target=target)
+    sweep.run_sweep(cells, accuracy_cell, f"{checkpoint_dir}/backends.jsonl", workers, print_cell)
+
+
+def pre_coding_accuracy(correction: list | None, workers: int=None):
     # Test the accuracy of the simulation for 24-bit strings with varying amount of '1'-counts with one simulator,
     # package length and shot amount
     n = 24
-    simulator = q_fp.FakeCusco()
     bitstrings = list((n - i) * "0" + i * "1" for i in range(n+1))
-    package_length = 8
-    shots = 1000000
 
-    # Prepare result arrays
-    one_count = list(range(n+1))
-    results = np.zeros(n+1)
+    cells = sweep_grid("bit_flip", correction=[correction], bitstring=bitstrings)
+    checkpoint = f"{checkpoint_dir}/bit_flip_{'off' if correction is None else 'on'}.jsonl"
+    sweep.run_sweep(cells, accuracy_cell, checkpoint, workers, print_cell)
+
+
+def decoherence_sweep(simulator, bitstring: str, package_length: int, delays_us: list, shots: int,
+                      metrics: list=None) -> np.ndarray:
+    # Determines metrics of the transmission for every delay, with the circuits transpiled once for all delays and all
+    # (delay, package) experiments simulated together (see simulation.simulate_delays). Returns a (delays x metrics)
+    # array, by default with the mean similarity and exact match rate as metrics.
+    metrics = [mean_similarity, exact_match_rate] if metrics is None else metrics
+    histograms = simulation.simulate_delays(simulator, bitstring, package_length, delays_us, shots)
+    return np.array(list(list(metric(bitstring, packet_counts) for metric in metrics) for packet_counts in histograms))
+
+
+def decoherence_accuracy(backends: list=None, delays_us: list=None, bitstring: str="111111111111",
+                         package_length: int=2, shots: int=1000) -> np.ndarray:
+    # Test the accuracy of the simulation for a range of delays between creating and encoding the Bell pairs, for one or
+    # more backends. Returns a (backends x delays) array of accuracies.
+    backends = ["FakeAlgiers"] if backends is None else backends
+    delays_us = list(np.linspace(0, 400, 101)) if delays_us is None else delays_us
 
-    # Simulate and record results
-    for i, bitstring in enumerate(bitstrings):
-        print(bitstring)
-        bitstring_results = simulation.simulate_full(simulator, bitstring, package_length, shots, correction_methods)
-        results[i] = accuracy_method_1(bitstring, bitstring_results)
+    accuracies = np.zeros((len(backends), len(delays_us)))
+    for b, backend in enumerate(backends):
+        profiles = decoherence_sweep(simulators.simulator(backend), bitstring, package_length, delays_us, shots,
+                                     [mean_similarity, exact_match_rate])
+        accuracies[b] = profiles[:, 0]
 
-    # Save results
-    data = np.column_stack((one_count, results))
-    np.savetxt(filename, data, fmt="%s")
+        for delay_us, (accuracy, exact) in zip(delays_us, profiles):
+            results_store.append("decoherence", {
+                "backend": backend, "package_length": package_length, "delay_us": float(delay_us),
+                "bitstring": bitstring, "shots": shots, "accuracy": float(accuracy), "exact_match_rate": float(exact),
+            })
+        print(backend, accuracies[b])
+
+    return accuracies
 
 
 def pre_coding_on_accuracy():
     # Test the accuracy of the simulation for 24-bit strings with varying amount of '1'-counts with pre_coding on
-    pre_coding_accuracy([(error_correction.pre_coding_optimize_encode, error_correction.pre_coding_optimize_decode, [4])],
-                      "results/bit_flip_on.txt")
+    pre_coding_accuracy(["pre_coding", 4])
 
 
 def pre_coding_off_accuracy():
     # Test the accuracy of the simulation for 24-bit strings with varying amount of '1'-counts with pre_coding off
-    pre_coding_accuracy([], "results/bit_flip_off.txt")
+    pre_coding_accuracy(None)
 
 
-def package_size_accuracy():
+def package_size_accuracy(workers: int=None, counts: bool=False, target: float=None):
     # Test the accuracy of the simulation for different package sizes with one simulator, bitstring, package length and
     # shot amount
     n = 14
-    simulator = q_fp.FakeCusco()
-    bitstring = "01010101"
     package_lengths = list(2 * i for i in range(1, n+1))
-    shots = 1000000
-
-    # Prepare result array
-    results = np.zeros(n)
-
-    # Simulate and record results
-    for i, package_length in enumerate(package_lengths):
-        print(package_length)
-        bitstring_results = simulation.simulate_full(simulator, bitstring, package_length, shots)
-        results[i] = accuracy_method_1(bitstring, bitstring_results)
 
-    # Save results
-    data = np.column_stack((package_lengths, results))
-    np.savetxt("results/package_length.txt", data, fmt="%s")
+    cells = sweep_grid("package_length", package_length=package_lengths, counts=counts, target=target)
+    sweep.run_sweep(cells, accuracy_cell, f"{checkpoint_dir}/package_length.jsonl", workers, print_cell)
 
 
-def repetition_accuracy():
+def repetition_accuracy(workers: int=None):
     # Test the accuracy of the simulation for different repetitions with one simulator, bitstring, package length and
     # shot amount
     n = 4
-    simulator = q_fp.FakeCusco()
-    bitstring = "01010101"
-    package_length = 8
-    shots = 1000000
-
-    # Prepare result arrays
     repetitions = list(2 * i + 1 for i in range(n))
-    results = np.zeros(n)
-
-    # Simulate and record results
-    for i, repetition in enumerate(repetitions):
-        print(repetition)
-        methods = [(error_correction.repetition_encode, error_correction.repetition_decode, [repetition])]
-        bitstring_results = simulation.simulate_full(simulator, bitstring, package_length, shots, methods)
-        results[i] = accuracy_method_1(bitstring, bitstring_results)
-
-    # Save results
-    data = np.column_stack((repetitions, results))
-    np.savetxt("results/repetitions.txt", data, fmt="%s")
+
+    cells = sweep_grid("repetitions", correction=list(["repetition", repetition] for repetition in repetitions))
+    sweep.run_sweep(cells, accuracy_cell, f"{checkpoint_dir}/repetitions.jsonl", workers, print_cell)
 
 
 def main():
@@ -0,0 +1,45 @@
+import sys
+
+sys.path.append("..")
+sys.path.append(".")
+
+import numpy as np
+
+import error_correction
+from packed_bits import stack, unstack
+
+
+rng = np.random.default_rng(0)
+test_bitstrings = list("".join(rng.choice(["0", "1"], size=24)) for _ in range(50))
+
+
+def repetition_batch_test():
+    for n in [1, 3, 5, 7]:
+        encoded = error_correction.repetition_encode_batch(stack(test_bitstrings), n)
+        assert unstack(encoded) == list(error_correction.repetition_encode(bitstring, n) for bitstring in test_bitstrings)
+
+        decoded = error_correction.repetition_decode_batch(stack(test_bitstrings), n)
+        assert unstack(decoded) == list(error_correction.repetition_decode(bitstring, n) for bitstring in test_bitstrings)
+
+
+def pre_coding_batch_test():
+    for n in [2, 4]:
+        encoded = error_correction.pre_coding_optimize_encode_batch(stack(test_bitstrings), n)
+        expected = list(error_correction.pre_coding_optimize_encode(bitstring, n) for bitstring in test_bitstrings)
+        assert unstack(encoded) == expected
+
+        # Flip single bits of the flags, which the decoder treats as inverted
+        noisy = list(("1" if i % 3 == 0 else bitstring[0]) + bitstring[1:] for i, bitstring in enumerate(expected))
+        decoded = error_correction.pre_coding_optimize_decode_batch(stack(noisy), n)
+        assert unstack(decoded) == list(error_correction.pre_coding_optimize_decode(bitstring, n) for bitstring in noisy)
+
+
+def get_batched_test():
+    assert error_correction.get_batched(error_correction.repetition_decode) is error_correction.repetition_decode_batch
+    assert error_correction.get_batched(len) is None
+
+
+if __name__ == "__main__":
+    repetition_batch_test()
+    pre_coding_batch_test()
+    get_batched_test()
@@ -5,6 +5,7 @@ sys.path.append(".")
 
 import image
 from image import Image
+from packed_bits import PackedBits
 
 from bitstring import Bits
 
@@ -29,6 +30,41 @@ def bitstr_mario_test():
     img2.display()
 
 
+def compress_packed_test():
+    bitstr = Image(mario_path).to_bitstr(compress_flag=False)
+    packed = PackedBits.from_str(bitstr)
+
+    # packed bits compress to the same payload as their string form
+    assert image.compress(packed).to_str() == image.compress(bitstr)
+    assert image.decompress(image.compress(packed)) == packed
+
+
+def codec_test():
+    img = Image(mario_path)
+    raw = img.to_bitstr(compress_flag=False, packed=True)
+
+    # every codec reproduces the pixels exactly, and the default codec sends fewer bits than the legacy one
+    for codec in image.codecs:
+        bitstr = img.to_bitstr(codec=codec)
+        assert Image.from_bitstr(bitstr, codec=codec).buffer.tobytes() == raw.to_bytes()
+    assert len(img.to_bitstr()) < len(img.to_bitstr(codec="lz4_ascii"))
+
+    assert image.rle_decode(image.rle_encode(bytes(600) + b"abcabc")) == bytes(600) + b"abcabc"
+
+
+def palette_test():
+    img = Image(mario_path)
+    bitstr = img.to_bitstr(image.PALETTE, compress_flag=False)
+
+    # 4 colors: a header of 8 + 4 * 24 bits, then 2 bits per pixel
+    assert len(bitstr) == 8 + 4 * 24 + 2 * 16 * 16
+    img2 = Image.from_bitstr(bitstr, encoding=image.PALETTE, compress_flag=False)
+    assert img2.buffer.tobytes() == img.buffer.convert("RGB").tobytes()
+
+    packed = img.to_bitstr(image.PALETTE, packed=True)
+    assert Image.from_bitstr(packed, encoding=image.PALETTE).buffer.tobytes() == img2.buffer.tobytes()
+
+
 def convert_bitstr_to_bytes_test():
     precision = 8
 
@@ -43,7 +79,19 @@ def convert_bitstr_to_bytes_test():
     assert test_str == result_str
 
 
+def convert_precision_test():
+    test_bytes = bytes([0, 1, 5, 7])
+
+    assert image.convert_bytes_to_bitstr(test_bytes, 3) == "000001101111"
+    assert image.convert_bytes_to_bitstr(test_bytes, 12) == "000000000000000000000001000000000101000000000111"
+    assert image.convert_bitstr_to_bytes("000001101111", 3) == bytes([0, 32, 160, 224])
+
+
 if __name__ == "__main__":
     # display_mario_test()
     bitstr_mario_test()
+    compress_packed_test()
+    codec_test()
+    palette_test()
     # convert_bitstr_to_bytes_test()
+    # convert_precision_test()
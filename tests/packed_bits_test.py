@@ -0,0 +1,70 @@
+import sys
+
+sys.path.append("..")
+sys.path.append(".")
+
+import error_correction
+from packed_bits import PackedBits
+
+
+test_bitstr = "0110100111010001101"
+
+
+def round_trip_test():
+    bits = PackedBits.from_str(test_bitstr)
+
+    assert len(bits) == len(test_bitstr)
+    assert bits.to_str() == test_bitstr
+    assert PackedBits.from_array(bits.to_array()) == bits
+    assert PackedBits.from_bytes(bits.to_bytes(), len(bits)) == bits
+
+
+def slicing_test():
+    bits = PackedBits.from_str(test_bitstr)
+
+    assert bits[3] == int(test_bitstr[3])
+    assert bits[-1] == int(test_bitstr[-1])
+    assert bits[8:16].to_str() == test_bitstr[8:16]
+    assert bits[3:11].to_str() == test_bitstr[3:11]
+    assert bits[::-1].to_str() == test_bitstr[::-1]
+
+
+def packets_test():
+    bits = PackedBits.from_str(test_bitstr)
+
+    for package_length in [2, 8, 16, 28]:
+        packets = bits.packets(package_length)
+        expected = list(test_bitstr[i:i + package_length] for i in range(0, len(test_bitstr), package_length))
+        assert list(packet.to_str() for packet in packets) == expected
+
+
+def invert_and_distance_test():
+    bits = PackedBits.from_str(test_bitstr)
+    inverted = bits.invert()
+
+    assert inverted.to_str() == error_correction.bitstring_invert(test_bitstr)
+    assert bits.hamming_distance(inverted) == len(test_bitstr)
+    assert bits.hamming_distance(test_bitstr) == 0
+    assert bits.count(1) + inverted.count(1) == len(test_bitstr)
+
+
+def error_correction_test():
+    bits = PackedBits.from_str(test_bitstr)
+
+    encoded = error_correction.repetition_encode(bits, 3)
+    assert encoded.to_str() == error_correction.repetition_encode(test_bitstr, 3)
+    assert error_correction.repetition_decode(encoded, 3) == bits
+    assert error_correction.repetition_decode(bits, 3).to_str() == error_correction.repetition_decode(test_bitstr, 3)
+
+    even_bits = bits[:18]
+    encoded = error_correction.pre_coding_optimize_encode(even_bits, 4)
+    assert encoded.to_str() == error_correction.pre_coding_optimize_encode(even_bits.to_str(), 4)
+    assert error_correction.pre_coding_optimize_decode(encoded, 4) == even_bits
+
+
+if __name__ == "__main__":
+    round_trip_test()
+    slicing_test()
+    packets_test()
+    invert_and_distance_test()
+    error_correction_test()
@@ -0,0 +1,134 @@
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append("..")
+sys.path.append(".")
+
+import numpy as np
+from qiskit.primitives import BitArray, PrimitiveResult
+from qiskit.primitives.containers import DataBin, SamplerPubResult
+from qiskit_ibm_runtime.fake_provider.local_service import QiskitRuntimeLocalService
+
+import job_cache
+import quantum_hardware
+import transpile_cache
+
+# Keep the circuits transpiled by these tests out of the developer's cache
+transpile_cache.cache_dir = Path(tempfile.mkdtemp())
+
+
+def job_result(shots: list[list[str]]) -> PrimitiveResult:
+    # Builds a sampler result with one pub per package from the measured strings of every shot
+    return PrimitiveResult(list(
+        SamplerPubResult(DataBin(meas=BitArray.from_samples(package, num_bits=len(package[0]))))
+        for package in shots
+    ))
+
+
+def parse_job_result_test():
+    results = job_result([["0111", "0111", "0110", "1111"], ["10", "10", "00", "00"]])
+
+    counts = quantum_hardware._parse_job_result(results, 4, decoder="counts")
+    assert counts.bitstring == "011110"
+    assert counts.detailed_results == [("0111", 0.5), ("10", 0.5)]
+    assert np.allclose(counts.marginals, [0.25, 1, 1, 0.75, 0.5, 0])
+
+    # Every 9-bit outcome is unique, but every bit is right in most shots
+    shots = ["011011011", "111011011", "001011010", "010111011", "011001111"]
+    majority = quantum_hardware._parse_job_result(job_result([shots]), 9, decoder="majority")
+    assert majority.bitstring == "011011011"
+    assert np.isclose(majority.fidelity, np.mean([0.8, 0.8, 0.8, 0.8, 0.8, 1, 0.8, 1, 0.8]))
+
+
+def runtime_client_test():
+    # A local service runs every job on the fake backend with Aer
+    client = quantum_hardware.RuntimeClient(QiskitRuntimeLocalService(), "fake_sherbrooke")
+    assert client.backend() is client.backend("fake_sherbrooke")
+
+    with client.batch():
+        jobs = list(quantum_hardware.submit("01110101", q, 100, client) for q in [4, 8])
+    results = list(quantum_hardware._parse_job_result(job.result(), q) for job, q in zip(jobs, [4, 8]))
+    assert all(result.bitstring == "01110101" for result in results)
+
+    # Previous jobs are fetched with the saved account, new jobs are submitted with default_service_options
+    assert quantum_hardware.default_client().service_options == {}
+    assert quantum_hardware.default_client() is quantum_hardware.default_client()
+    submitting = quantum_hardware.default_client(**quantum_hardware.default_service_options)
+    assert submitting.service_options == quantum_hardware.default_service_options
+
+
+class FailingJob(quantum_hardware.QueuedJob):
+    def result(self):
+        raise RuntimeError("Job failed")
+
+
+class FailingFirstClient(quantum_hardware.LocalQueueClient):
+    # Local client whose first job fails
+    def submit(self, circuits: list, shots: int = 1024, backend: str = None):
+        job = super().submit(circuits, shots, backend)
+        return FailingJob(job, 0.0) if self._submissions == 1 else job
+
+
+def run_many_test():
+    job_cache.cache_dir = Path(tempfile.mkdtemp())
+    client = quantum_hardware.LocalQueueClient(delays=[0.5, 0.0])
+    finished = []
+
+    results = quantum_hardware.run_many(
+        "01110101", [4, 8], shots=100, client=client, poll_interval=0.05,
+        callback=lambda package_size, result: finished.append(package_size),
+    )
+    assert sorted(finished) == [4, 8]
+    assert all(result.bitstring == "01110101" for result in results)
+
+    # A failed job does not keep the other configurations from being handled
+    finished.clear()
+    try:
+        quantum_hardware.run_many(
+            "01110101", [4, 8], shots=100, client=FailingFirstClient(delays=[0.0, 0.5]), poll_interval=0.05,
+            callback=lambda package_size, result: finished.append(package_size),
+        )
+        assert False
+    except RuntimeError as error:
+        assert "package size 4" in str(error)
+    assert finished == [8]
+
+
+class CountingClient:
+    # Client that returns a fixed result for any job, counting how often a job is fetched
+    def __init__(self, results: PrimitiveResult):
+        self.results = results
+        self.fetches = 0
+
+    def job(self, job_id: str):
+        self.fetches += 1
+        return self
+
+    def result(self) -> PrimitiveResult:
+        return self.results
+
+
+def job_cache_test():
+    job_cache.cache_dir = Path(tempfile.mkdtemp())
+    client = CountingClient(job_result([["0111", "0111", "0110"], ["10", "10", "00"]]))
+
+    first = quantum_hardware.fetch_previous_job("job-1", 4, client=client)
+    second = quantum_hardware.fetch_previous_job("job-1", 4, decoder="majority", client=client)
+    assert client.fetches == 1
+    assert first.bitstring == second.bitstring == "011110"
+    assert np.allclose(first.marginals, second.marginals)
+
+    bit_arrays = job_cache.load("job-1")
+    assert isinstance(bit_arrays[0].array, np.memmap)
+    assert bit_arrays[1].get_counts() == {"10": 2, "00": 1}
+
+    job_cache.clear()
+    assert job_cache.load("job-1") is None
+
+
+if __name__ == "__main__":
+    parse_job_result_test()
+    runtime_client_test()
+    run_many_test()
+    job_cache_test()
@@ -0,0 +1,37 @@
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append("..")
+sys.path.append(".")
+
+import numpy as np
+
+import results_store
+
+
+def append_records_test():
+    store = Path(tempfile.mkdtemp())
+    rng = np.random.default_rng(0)
+    outcomes = rng.integers(0, 2, size=(100, 13), dtype=np.uint8)
+
+    results_store.append("package_length", {"backend": "FakeCusco", "package_length": 4, "accuracy": 0.5}, store=store)
+    results_store.append("package_length", {"backend": "FakeCusco", "package_length": 2, "accuracy": 0.75}, outcomes,
+                         store=store)
+    results_store.append("package_length", {"backend": "FakeKyiv", "package_length": 2, "accuracy": 0.25}, store=store)
+
+    records = results_store.records("package_length", store, backend="FakeCusco")
+    assert len(records) == 2
+    assert records[0].outcomes is None
+    assert records[1].packed_outcomes.shape == (100, 2)
+    assert np.array_equal(records[1].outcomes, outcomes)
+
+    package_lengths, accuracies = results_store.table("package_length", "package_length", store=store,
+                                                      backend="FakeCusco")
+    assert list(package_lengths) == [2, 4]
+    assert list(accuracies) == [0.75, 0.5]
+    assert results_store.records("repetitions", store) == []
+
+
+if __name__ == "__main__":
+    append_records_test()
@@ -0,0 +1,165 @@
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append("..")
+sys.path.append(".")
+
+import numpy as np
+from qiskit_aer import AerSimulator
+from qiskit_aer.noise import NoiseModel, depolarizing_error
+from qiskit_ibm_runtime import fake_provider as q_fp
+
+import pair_simulation
+import simulation
+import transpile_cache
+from packed_bits import stack
+
+# Keep the circuits transpiled by these tests out of the developer's cache
+transpile_cache.cache_dir = Path(tempfile.mkdtemp())
+
+
+test_bitstring = "0111010110"
+
+
+def simulate_array_test():
+    simulator = AerSimulator()
+    circuits = simulation.build_circuits_transpiled(test_bitstring, 4, simulator)
+
+    results = simulation.simulate(simulator, circuits, 3)
+    matrix = simulation.simulate(simulator, circuits, 3, as_array=True)
+    counts_matrix = simulation.simulate(simulator, circuits, 3, as_array=True, memory=False)
+
+    assert results == [test_bitstring] * 3
+    assert np.array_equal(matrix, stack(results))
+    assert np.array_equal(counts_matrix, matrix)
+
+
+def template_test():
+    simulator = AerSimulator.from_backend(q_fp.FakeCusco())
+    simulator.set_options(noise_model=None)
+
+    # Circuits built from templates decode like circuits transpiled package by package
+    bitstring = test_bitstring + "11"
+    for use_templates in [True, False]:
+        circuits = simulation.build_circuits_transpiled(bitstring, 4, simulator, use_templates=use_templates)
+        assert simulation.simulate(simulator, circuits, 2) == [bitstring] * 2
+
+    # An odd remainder package is rejected before any template is built
+    try:
+        simulation.build_circuits_transpiled(test_bitstring + "1", 4, simulator)
+        assert False
+    except ValueError:
+        pass
+
+
+def select_method_test():
+    # Superdense coding circuits are Clifford, so they use the stabilizer method without noise or with Pauli noise
+    circuits = simulation.build_circuits_transpiled(test_bitstring, 4, AerSimulator())
+    assert simulation.select_method(AerSimulator(), circuits)[0] == "stabilizer"
+    noise_model = NoiseModel()
+    noise_model.add_all_qubit_quantum_error(depolarizing_error(0.01, 2), ["cx"])
+    assert simulation.select_method(AerSimulator(noise_model=noise_model), circuits)[0] == "stabilizer"
+
+    # Relaxation noise of a backend needs a density matrix, or matrix product states for wide circuits
+    simulator = AerSimulator.from_backend(q_fp.FakeCusco())
+    narrow = simulation.build_circuits_transpiled("0110", 4, simulator)
+    wide = simulation.build_circuits_transpiled("011011000110", 12, simulator)
+    assert simulation.select_method(simulator, narrow)[0] == "density_matrix"
+    assert simulation.select_method(simulator, wide)[0] == "matrix_product_state"
+
+    options = simulation.execution_options(simulator, wide, method="statevector", max_parallel_shots=1)
+    assert (options["method"], options["max_parallel_shots"]) == ("statevector", 1)
+
+
+def counts_to_array_test():
+    matrix = simulation.counts_to_array({"01": 2, "10": 1}, 2)
+
+    assert matrix.shape == (3, 2)
+    assert sorted(map(tuple, matrix)) == [(0, 1), (0, 1), (1, 0)]
+
+
+def simulate_pairs_test():
+    simulator = AerSimulator()
+    bitstring = test_bitstring * 13
+
+    # Packages wider than 28 bits are allowed because every Bell pair is simulated on its own
+    matrix = pair_simulation.simulate_pairs(simulator, bitstring, 64, 4)
+    assert matrix.shape == (4, len(bitstring))
+    assert np.array_equal(matrix, stack([bitstring] * 4))
+
+    distribution_matrix = pair_simulation.simulate_pairs(simulator, bitstring, 64, 4, calibration_shots=100)
+    assert np.array_equal(distribution_matrix, matrix)
+
+
+def simulate_ideal_test():
+    bitstring = test_bitstring * 3
+
+    assert simulation.is_ideal(AerSimulator())
+    assert simulation.simulate_full(AerSimulator(), bitstring, 8, 2) == [bitstring] * 2
+
+    matrix = simulation.simulate_ideal(bitstring, 8, 2, validate=True)
+    assert np.array_equal(matrix, stack([bitstring] * 2))
+
+    # The closed form accepts exactly the payloads the circuits accept
+    for invalid in ["011", "0120"]:
+        try:
+            simulation.simulate_full(AerSimulator(), invalid, 4, 2)
+            assert False
+        except ValueError:
+            pass
+
+
+def dedup_packages_test():
+    unique, inverse, multiplicity = simulation.dedup_packages(["0101", "1111", "0101", "0101"])
+
+    assert unique == ["0101", "1111"]
+    assert list(inverse) == [0, 1, 0, 0]
+    assert list(multiplicity) == [3, 1]
+
+
+def simulate_counts_test():
+    counts = {"00": 5, "01": 7, "11": 12}
+    parts = simulation.split_counts(counts, 3, np.random.default_rng(0))
+    assert list(sum(part.values()) for part in parts) == [8, 8, 8]
+    assert sum(part.get("01", 0) for part in parts) == 7
+
+    simulator = q_fp.FakeAlgiers()
+    histograms = simulation.simulate_full(simulator, "010101100101", 4, 100, counts=True)
+    assert len(histograms) == 3
+    assert all(sum(histogram.values()) == 100 and len(next(iter(histogram))) == 4 for histogram in histograms)
+    assert max(histograms[0], key=histograms[0].get) == "0101"
+
+    undeduplicated = simulation.simulate_full(simulator, "010101100101", 4, 100, counts=True, dedup=False)
+    assert len(undeduplicated) == 3 and all(sum(histogram.values()) == 100 for histogram in undeduplicated)
+
+    assert simulation.simulate_full(AerSimulator(), "0101", 2, 10, counts=True) == [{"01": 10}, {"01": 10}]
+
+
+def simulate_delays_test():
+    simulator = q_fp.FakeAlgiers()
+    template = simulation.get_template(4, simulator, None)
+
+    # Filling in the delay placeholder gives the same delays as transpiling a circuit with that delay
+    circuit = template.build("0110", 300.0)
+    reference = simulation.build_circuit_transpiled("0110", simulator, 300.0)
+    def durations(circuit):
+        return list(instruction.operation.params for instruction in circuit.data if instruction.operation.name == "delay")
+
+    assert durations(circuit) == durations(reference)
+    assert template.build("0110") == simulation.build_circuit_transpiled("0110", simulator)
+
+    histograms = simulation.simulate_delays(AerSimulator(), "01101100", 4, [0.0, 10.0, 20.0], 10)
+    assert histograms == [[{"0110": 10}, {"1100": 10}]] * 3
+
+
+if __name__ == "__main__":
+    simulate_array_test()
+    template_test()
+    select_method_test()
+    counts_to_array_test()
+    simulate_pairs_test()
+    simulate_ideal_test()
+    dedup_packages_test()
+    simulate_counts_test()
+    simulate_delays_test()
@@ -0,0 +1,30 @@
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append("..")
+sys.path.append(".")
+
+import simulators
+
+
+def simulator_factory_test():
+    simulators.cache_dir = Path(tempfile.mkdtemp())
+
+    simulator = simulators.simulator("FakeAlgiers")
+    assert simulators.simulator("FakeAlgiers") is simulator
+    assert not simulator.options.noise_model.is_ideal()
+    assert simulators.simulator("FakeAlgiers", noise=False).options.noise_model is None
+    assert len(list(simulators.cache_dir.glob("*.noise.pickle"))) == 1
+
+    # A new process loads the noise model from disk instead of extracting it again
+    simulators._simulators.clear()
+    reloaded = simulators.noise_model(simulators.backend("FakeAlgiers"))
+    assert reloaded == simulator.options.noise_model
+
+    simulators.clear()
+    assert not list(simulators.cache_dir.glob("*.pickle"))
+
+
+if __name__ == "__main__":
+    simulator_factory_test()
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+sys.path.append("..")
+sys.path.append(".")
+
+import sweep
+
+
+def square(cell: dict) -> int:
+    return cell["x"] ** 2
+
+
+def threads(cell: dict) -> int:
+    return sweep.worker_threads
+
+
+def failing(cell: dict) -> int:
+    raise RuntimeError("Cell should have been resumed from the checkpoint")
+
+
+def slow_square(cell: dict) -> int:
+    if cell["x"] == 0:
+        raise RuntimeError("Cell failed")
+    time.sleep(0.2)
+    return cell["x"] ** 2
+
+
+def run_sweep_test():
+    cells = sweep.grid(x=[1, 2, 3], y=["a", "b"])
+    assert len(cells) == 6
+    assert cells[1] == {"x": 1, "y": "b"}
+
+    checkpoint = Path(tempfile.mkdtemp()) / "sweep.jsonl"
+    assert sweep.run_sweep(cells, square, checkpoint, workers=2) == [1, 1, 4, 4, 9, 9]
+
+    # A line cut off by a crash is ignored, and finished cells are not run again
+    with open(checkpoint, "a") as file:
+        file.write('{"cell": {"x": 4')
+    seen = []
+    results = sweep.run_sweep(cells, failing, checkpoint, on_result=lambda cell, result: seen.append(result))
+    assert results == [1, 1, 4, 4, 9, 9]
+    assert sorted(seen) == results
+
+    # New results after a cut off line are still read back
+    cells = sweep.grid(x=[4], y=["a"])
+    assert sweep.run_sweep(cells, square, checkpoint) == [16]
+    assert sweep.load_checkpoint(checkpoint)[sweep.cell_key(cells[0])] == 16
+
+    # Every worker gets its share of the cores
+    checkpoint = Path(tempfile.mkdtemp()) / "threads.jsonl"
+    assert sweep.run_sweep(cells, threads, checkpoint, workers=2) == [max(1, os.cpu_count() // 2)]
+
+
+def failing_cell_test():
+    # One failing cell among slow ones: all other cells are still checkpointed
+    cells = sweep.grid(x=[0, 1, 2, 3])
+    checkpoint = Path(tempfile.mkdtemp()) / "sweep.jsonl"
+    try:
+        sweep.run_sweep(cells, slow_square, checkpoint, workers=2)
+        assert False
+    except RuntimeError as error:
+        assert "1 of 4 cells failed" in str(error)
+    assert sorted(sweep.load_checkpoint(checkpoint).values()) == [1, 4, 9]
+
+    # Resuming only runs the failed cell again
+    assert sweep.run_sweep(cells, square, checkpoint) == [0, 1, 4, 9]
+
+
+if __name__ == "__main__":
+    run_sweep_test()
+    failing_cell_test()
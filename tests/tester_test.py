@@ -0,0 +1,72 @@
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append("..")
+sys.path.append(".")
+
+import numpy as np
+from qiskit_aer import AerSimulator
+
+import tester
+import transpile_cache
+from packed_bits import stack
+
+# Keep the circuits transpiled by these tests out of the developer's cache
+transpile_cache.cache_dir = Path(tempfile.mkdtemp())
+
+
+def metrics_test():
+    bitstring = "0101"
+    results = ["0101", "0100", "1101", "0101"]
+    matrix = stack(results)
+    counts = {"0101": 2, "0100": 1, "1101": 1}
+
+    for form in [results, matrix, counts]:
+        assert np.allclose(tester.error_profile(bitstring, form), [0.25, 0, 0, 0.25])
+        assert tester.bit_error_rate(bitstring, form) == 0.125
+        assert tester.mean_similarity(bitstring, form) == 0.875
+        assert tester.exact_match_rate(bitstring, form) == 0.5
+        assert tester.histogram(form) == counts
+
+    assert tester.accuracy_method_1(bitstring, results) == np.mean(list(
+        tester.string_comparison(bitstring, result) for result in results
+    ))
+    assert tester.accuracy_method_2(bitstring, results) == results.count(bitstring) / len(results)
+
+    # Per-package histograms of two independent 2-bit packages
+    packet_counts = [{"01": 3, "11": 1}, {"01": 2, "00": 2}]
+    assert np.allclose(tester.error_profile(bitstring, packet_counts), [0.25, 0, 0, 0.5])
+    assert tester.exact_match_rate(bitstring, packet_counts) == 0.75 * 0.5
+
+    try:
+        tester.mean_similarity(bitstring, ["010"])
+        assert False
+    except ValueError:
+        pass
+
+
+def adaptive_accuracy_test():
+    rng = np.random.default_rng(0)
+    matrix = (rng.random((4000, 8)) < 0.1).astype(np.uint8)
+    accuracy, halfwidth = tester.similarity_interval("00000000", matrix)
+    packet_accuracy, packet_halfwidth = tester.similarity_interval(
+        "00000000", [tester.histogram(matrix[:, :4]), tester.histogram(matrix[:, 4:])]
+    )
+    assert abs(accuracy - 0.9) < 3 * halfwidth
+    assert np.isclose(accuracy, packet_accuracy)
+    assert np.isclose(halfwidth, packet_halfwidth, rtol=0.05)
+
+    assert tester.majority_settled([{"01": 90, "11": 10}, {"00": 5}])
+    assert not tester.majority_settled([{"01": 12, "11": 10}])
+
+    # Without noise no errors are seen, but the interval only becomes narrow enough after enough shots
+    assert tester.similarity_interval("0000", np.zeros((100, 4), dtype=np.uint8))[1] > 0.0
+    result = tester.adaptive_accuracy(AerSimulator(), "01011100", 4, target=0.001, min_shots=100)
+    assert (result.accuracy, result.shots, result.converged) == (1.0, 400, True)
+    assert 0.0 < result.halfwidth <= 0.001
+
+
+if __name__ == "__main__":
+    metrics_test()
+    adaptive_accuracy_test()
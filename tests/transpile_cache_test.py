@@ -0,0 +1,31 @@
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append("..")
+sys.path.append(".")
+
+from qiskit_aer import AerSimulator
+
+import simulation
+import transpile_cache
+
+
+def cached_transpile_test():
+    simulator = AerSimulator()
+    transpile_cache.cache_dir = Path(tempfile.mkdtemp())
+
+    first = transpile_cache.cached_transpile(simulation.build_circuit("0110"), simulator)
+    second = transpile_cache.cached_transpile(simulation.build_circuit("0110"), simulator)
+    other = transpile_cache.cached_transpile(simulation.build_circuit("0111"), simulator)
+
+    assert len(list(transpile_cache.cache_dir.glob("*.qpy"))) == 2
+    assert first == second
+    assert first != other
+
+    transpile_cache.clear()
+    assert not list(transpile_cache.cache_dir.glob("*.qpy"))
+
+
+if __name__ == "__main__":
+    cached_transpile_test()
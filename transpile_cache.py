@@ -0,0 +1,123 @@
+import hashlib
+import os
+from pathlib import Path
+
+import qiskit
+from qiskit import QuantumCircuit, qpy, transpile
+
+import disk_cache
+
+# Content-addressed disk cache of transpiled circuits, stored as QPY files. The key combines the structure of the
+# circuit, the backend name, a hash of the backend's target (which holds its calibration) and the transpile options,
+# so a cached circuit is reused across processes for as long as none of these change.
+# Set QGP_TRANSPILE_CACHE=0 to turn the cache off, or QGP_TRANSPILE_CACHE_DIR to move it.
+
+enabled: bool = os.environ.get("QGP_TRANSPILE_CACHE", "1") != "0"
+cache_dir: Path = Path(
+    os.environ.get("QGP_TRANSPILE_CACHE_DIR", Path.home() / ".cache" / "quantum_group_project" / "transpile")
+)
+max_bytes: int = 512 * 1024 * 1024
+
+# The size limit is enforced every evict_interval writes
+evict_interval: int = 64
+
+# Fingerprints of the backends seen in this process, and the amount of entries written by it
+_fingerprints: dict = {}
+_writes: int = 0
+
+
+def circuit_fingerprint(circuit: QuantumCircuit) -> str:
+    # Hashes the structure of a circuit. Unlike its QPY serialization, this ignores the generated circuit name.
+    digest = hashlib.sha256()
+    digest.update(repr((circuit.num_qubits, list((reg.name, reg.size) for reg in circuit.cregs))).encode())
+    for instruction in circuit.data:
+        digest.update(repr((
+            instruction.operation.name,
+            list(instruction.operation.params),
+            getattr(instruction.operation, "label", None),
+            list(circuit.find_bit(qubit).index for qubit in instruction.qubits),
+            list(circuit.find_bit(clbit).index for clbit in instruction.clbits),
+        )).encode())
+    return digest.hexdigest()
+
+
+def backend_fingerprint(backend) -> str:
+    # Hashes the name and target of a backend, including the duration and error of every instruction, so a new
+    # calibration gives a new fingerprint
+    if backend not in _fingerprints:
+        target = backend.target
+        digest = hashlib.sha256()
+        digest.update(repr((backend.name, target.num_qubits, target.dt)).encode())
+        for name in sorted(target.operation_names):
+            properties = target[name]
+            for qargs in sorted(properties, key=repr):
+                instruction = properties[qargs]
+                digest.update(repr((
+                    name, qargs,
+                    None if instruction is None else (instruction.duration, instruction.error),
+                )).encode())
+        _fingerprints[backend] = digest.hexdigest()
+    return _fingerprints[backend]
+
+
+def cache_key(circuit: QuantumCircuit, backend, options: dict) -> str:
+    digest = hashlib.sha256()
+    digest.update(circuit_fingerprint(circuit).encode())
+    digest.update(backend_fingerprint(backend).encode())
+    digest.update(repr(sorted(options.items())).encode())
+    digest.update(qiskit.__version__.encode())
+    return digest.hexdigest()
+
+
+def evict(limit: int = None) -> None:
+    # Removes the least recently used files until the cache fits in limit bytes
+    limit = max_bytes if limit is None else limit
+    files = list(cache_dir.glob("*.qpy"))
+    stats = {path: path.stat() for path in files}
+    total = sum(stat.st_size for stat in stats.values())
+
+    for path in sorted(files, key=lambda path: stats[path].st_mtime):
+        if total <= limit:
+            break
+        path.unlink(missing_ok=True)
+        total -= stats[path].st_size
+
+
+def clear() -> None:
+    evict(0)
+
+
+def _write(transpiled: QuantumCircuit, file) -> None:
+    global _writes
+    qpy.dump(transpiled, file)
+    _writes += 1
+
+
+def cached_transpile(circuit: QuantumCircuit, backend, **options) -> QuantumCircuit:
+    """Transpiles a circuit for a backend, reusing a previously transpiled circuit from disk when possible
+
+    Args:
+        circuit (QuantumCircuit): Circuit to transpile
+        backend: Backend or simulator to transpile for
+        **options: Other options passed on to transpile
+
+    Returns:
+        QuantumCircuit: Returns the transpiled circuit
+    """
+    if not enabled:
+        return transpile(circuit, backend, **options)
+
+    path = cache_dir / f"{cache_key(circuit, backend, options)}.qpy"
+
+    def read(file) -> QuantumCircuit:
+        transpiled = qpy.load(file)[0]
+        # Mark the file as recently used for eviction
+        os.utime(path)
+        return transpiled
+
+    writes = _writes
+    transpiled = disk_cache.cached(path, lambda: transpile(circuit, backend, **options), read, _write)
+    if _writes != writes and (_writes - 1) % evict_interval == 0:
+        evict()
+
+    return transpiled